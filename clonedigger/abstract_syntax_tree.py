@@ -154,6 +154,8 @@ class AbstractSyntaxTree(object):
 
     :param _hash: Hash of the tree
     :type _hash: int
+    :param _fingerprint: Structural hash of the whole tree
+    :type _fingerprint: int
     :param _mark: Used for clustering
     :type _mark: Cluster
 
@@ -167,6 +169,8 @@ class AbstractSyntaxTree(object):
     :type _size: float
     :param _none_count: Number of None node in subtrees
     :type _none_count: int
+    :param _leaf_names: Names of the leaves of the tree
+    :type _leaf_names: FrozenSet[str]
     """
 
     def __init__(self, name=None, line_numbers=[], source_file=None):
@@ -179,6 +183,7 @@ class AbstractSyntaxTree(object):
         self._is_statement = False
 
         self._hash = None
+        self._fingerprint = None
         self._mark = None
 
         self._parent = None
@@ -186,6 +191,8 @@ class AbstractSyntaxTree(object):
         self._height = None
         self._size = None
         self._none_count = None
+        self._leaf_names = None
+        self._token_count = None
 
     # Members operations
 
@@ -351,11 +358,14 @@ class AbstractSyntaxTree(object):
         """Compute the number of nodes and free variables cost recursively
 
         The number of nodes and `free_variable_cost`, also compute the number
-        of None node
+        of None node. The size is computed only once, subsequent calls are
+        cheap and can be used to make sure the size is available.
 
         :returns: Size of tree
         :rtype: {float}
         """
+        if self._size is not None:
+            return
         observed = set()
         self._none_count = 0
 
@@ -376,13 +386,35 @@ class AbstractSyntaxTree(object):
                 else:
                     r += 1
             return r
-        if self._size is None:
-            self._size = rec_calc_size(self)
+        self._size = rec_calc_size(self)
+
+    def getLeafNames(self):
+        """Return the names of the leaves of the tree, except free variables
+
+        Every distinct name accounts for 1 in the size of the tree (see
+        storeSize). The value is computed once, so it must only be called on
+        completed trees.
+
+        :returns: Names of the leaves
+        :rtype: {FrozenSet[str]}
+        """
+        if self._leaf_names is None:
+            names = set()
+            stack = [self]
+            while stack:
+                t = stack.pop()
+                if t.getChildCount():
+                    stack.extend(t.getChilds())
+                elif t.__class__.__name__ != 'FreeVariable':
+                    names.add(t.getName())
+            self._leaf_names = frozenset(names)
+        return self._leaf_names
 
     def getTokenCount(self):
         """Count certain tokens in tree
 
-        Tokens are listed below
+        Tokens are listed below. The value is computed once, so it must only
+        be called on completed trees.
 
         :returns: Number of tokens
         :rtype: {int}
@@ -407,7 +439,9 @@ class AbstractSyntaxTree(object):
                 else:
                     return 1
             return r
-        return rec_calc_size(self)
+        if self._token_count is None:
+            self._token_count = rec_calc_size(self)
+        return self._token_count
 
     # Compute hashes
 
@@ -440,6 +474,21 @@ class AbstractSyntaxTree(object):
         """
         return self.getDCupHash(-1)
 
+    def getFingerprint(self):
+        """Return a structural hash of the whole tree
+
+        Unlike getFullHash, the value is computed once and stored in every
+        node, so it must only be called on completed trees. Equal trees have
+        equal fingerprints, it is used to index trees by their structure.
+
+        :returns: a tree hash
+        :rtype: {int}
+        """
+        if self._fingerprint is None:
+            self._fingerprint = hash(
+                (self._name, tuple([c.getFingerprint() for c in self._childs])))
+        return self._fingerprint
+
     def __hash__(self):
         # TODO check correctness
         if not self._hash:
@@ -497,9 +546,34 @@ class StatementSequence(object):
         else:
             assert(self._source_file == statement.getSourceFile())
 
+    def getStatements(self):
+        return self._sequence
+
+    def getSlice(self, first, end):
+        """Return the statements [first, end) as a StatementSequence
+
+        The statements are not checked one by one as they all come from the
+        source file of this sequence.
+
+        :param first: Index of the first statement
+        :type first: int
+        :param end: Index after the last statement
+        :type end: int
+        :returns: Sequence of the statements [first, end)
+        :rtype: {StatementSequence}
+        """
+        r = StatementSequence()
+        r._sequence = self._sequence[first:end]
+        if r._sequence:
+            r._source_file = self._source_file
+        return r
+
     def __getitem__(self, *args):
         return self._sequence.__getitem__(*args)
 
+    def __iter__(self):
+        return iter(self._sequence)
+
     def __len__(self):
         return self._sequence.__len__()
 
@@ -530,6 +604,19 @@ class StatementSequence(object):
     def getCoveredLineNumbersCount(self):
         return len(self.getCoveredLineNumbers())
 
+    def getLocation(self):
+        """Return the file name and the first and last covered lines
+
+        Used to order fragments and clones independently of how they were found.
+
+        :rtype: {Tuple[str, int, int]}
+        """
+        line_numbers = self.getCoveredLineNumbers()
+        return (self.getSourceFile().getFileName(), min(line_numbers), max(line_numbers))
+
+    def getTokenCount(self):
+        return sum([statement.getTokenCount() for statement in self])
+
     def getLineNumberHashables(self):
         """Return covered line numbers as (source_file, line_number)
 
@@ -582,8 +669,23 @@ class StatementSequence(object):
 
 
 class PairSequences(object):
+    """Holds two sequences of statements
+
+    The distance between the sequences and the substitutions of their
+    anti-unifier are computed once and kept, so that the reports reuse the
+    ones computed while refining the candidates.
+
+    :param _sequences: The two sequences
+    :type _sequences: List[StatementSequence]
+    :param _distance: Distance between the sequences, see calcDistance
+    :type _distance: float
+    :param _substitutions: Substitutions of every statement, see getSubstitutions
+    :type _substitutions: List[List[Tuple[AbstractSyntaxTree, AbstractSyntaxTree]]]
+    """
     def __init__(self, sequences):
         self._sequences = sequences
+        self._distance = None
+        self._substitutions = None
 
     def __getitem__(self, *args):
         return self._sequences.__getitem__(*args)
@@ -600,13 +702,42 @@ class PairSequences(object):
         return self[0].getWeight()
 
     def calcDistance(self):
+        """Return the size of the anti-unifier of the two sequences.
+
+        The anti-unifier itself is not built, see anti_unification.unifier_size.
+
+        :returns: Distance between the two sequences
+        :rtype: {float}
+        """
         from . import anti_unification
-        trees = [s.constructTree() for s in self]
-        unifier = anti_unification.Unifier(trees[0], trees[1])
-        return unifier.getSize()
+        if self._distance is None:
+            if self[0].getLength() != self[1].getLength():
+                trees = [s.constructTree() for s in self]
+                self._distance = anti_unification.unifier_size(trees[0], trees[1])
+            else:
+                self._distance = anti_unification.substitutions_size(self.getSubstitutions())
+        return self._distance
+
+    def getSubstitutions(self):
+        """Return the pairs of trees substituted by the anti-unifier in every statement
+
+        See anti_unification.statement_substitutions, the sequences must have
+        the same length.
+
+        :returns: For every statement, the pairs of substituted trees
+        :rtype: {List[List[Tuple[AbstractSyntaxTree, AbstractSyntaxTree]]]}
+        """
+        from . import anti_unification
+        if self._substitutions is None:
+            self._substitutions = anti_unification.statement_substitutions(self[0], self[1])
+        return self._substitutions
 
     def subSequence(self, first, length):
-        return PairSequences([StatementSequence(self[0][first:first + length]), StatementSequence(self[1][first:first + length])])
+        r = PairSequences([StatementSequence(self[0][first:first + length]), StatementSequence(self[1][first:first + length])])
+        if self._substitutions is not None:
+            # Substitutions are computed statement by statement
+            r._substitutions = self._substitutions[first:first + length]
+        return r
 
     def getLength(self):
         """Return length of first sequence
@@ -617,3 +748,56 @@ class PairSequences(object):
 
     def getMaxCoveredLineNumbersCount(self):
         return min([s.getCoveredLineNumbersCount() for s in self])
+
+
+class CloneClass(object):
+    """Holds fragments of code which are all clones of each other
+
+    Built by clone_detection_algorithm.build_clone_classes from PairSequences
+    sharing fragments, so all the fragments have the same length.
+
+    :param _sequences: Fragments of the class
+    :type _sequences: List[StatementSequence]
+    :param _pairs: Pairs linking all the fragments, defaults to the pairs
+        (first fragment, other fragment)
+    :type _pairs: List[PairSequences], optional
+    """
+    def __init__(self, sequences, pairs=None):
+        self._sequences = sequences
+        if pairs is None:
+            pairs = [PairSequences([sequences[0], s]) for s in sequences[1:]]
+        self._pairs = pairs
+
+    def __getitem__(self, *args):
+        return self._sequences.__getitem__(*args)
+
+    def __iter__(self):
+        return iter(self._sequences)
+
+    def __len__(self):
+        return len(self._sequences)
+
+    def __str__(self):
+        return ';\t'.join([str(s) for s in self])
+
+    def getPairs(self):
+        """Return the pairs linking all the fragments
+
+        :returns: len(self) - 1 pairs
+        :rtype: {List[PairSequences]}
+        """
+        return self._pairs
+
+    def calcDistance(self):
+        """Return the maximum distance between the fragments of a pair
+
+        :returns: Distance of the class
+        :rtype: {float}
+        """
+        return max([pair.calcDistance() for pair in self.getPairs()])
+
+    def getLength(self):
+        return self[0].getLength()
+
+    def getMaxCoveredLineNumbersCount(self):
+        return min([s.getCoveredLineNumbersCount() for s in self])
@@ -29,8 +29,6 @@ from builtins import range
 from builtins import *
 from builtins import object"""
 
-from copy import copy
-
 from .abstract_syntax_tree import AbstractSyntaxTree, free_variable_cost
 from . import arguments
 
@@ -69,7 +67,7 @@ class Substitution(object):
         :returns: Substituated tree
         :rtype: {AbstractSyntaxTree}
         """
-        if tree in list(self._map.keys()):
+        if tree in self._map:
             return self._map[tree]
         else:
             if isinstance(tree, FreeVariable):
@@ -138,7 +136,10 @@ class Unifier(object):
     :type ignore_parametrization: bool, optional
     """
     def __init__(self, t1, t2, ignore_parametrization=False):
-        (self._unifier, self._substitutions) = self._unify(t1, t2, ignore_parametrization)
+        self._substitutions = (Substitution(), Substitution())
+        # Dict[(fingerprint1, fingerprint2) -> List[FreeVariable]]
+        self._substitutions_index = {}
+        self._unifier = self._unify(t1, t2, ignore_parametrization)
         self._unifier.storeSize()
         for i in (0, 1):
             for key in self._substitutions[i].getMap():
@@ -153,53 +154,44 @@ class Unifier(object):
     def getSize(self):
         return sum([s.getSize() for s in self.getSubstitutions()])
 
-    def _combineSubs(self, node, s, t, ignore_parametrization=False):
-        """Aggregate substitutions.
+    def _combineSubs(self, node1, node2, ignore_parametrization=False):
+        """Return the FreeVariable that replaces node1 and node2.
 
-        Given an anti-unifier and two substitutions,
-        modify node by replacing trees if the substittion are the same.
-        If ignore_parametrization is True, this function morally performs `t.update(s)`.
-        Else: some keys are not updated, but they will modify the `node`.
+        If node1 and node2 are already replaced by a FreeVariable (i.e. the
+        same substitution is performed for both trees), this FreeVariable is
+        reused. The substitutions are indexed by the fingerprints of their
+        values, so this lookup does not depend on the number of substitutions.
+        If ignore_parametrization is True, a new FreeVariable is always created.
 
-        :param node: anti-unifier
-        :type node: AbstractSyntaxTree
-        :param s: A substitution to use as update
-        :type s: Tuple[Substitution,Substitution]]
-        :param t: A substitution to update
-        :type t: Tuple[Substitution,Substitution]]
+        :param node1: Tree to be replaced in the first substitution
+        :type node1: AbstractSyntaxTree
+        :param node2: Tree to be replaced in the second substitution
+        :type node2: AbstractSyntaxTree
         :param ignore_parametrization: TODO:, defaults to False
         :type ignore_parametrization: bool, optional
-        :returns: an updated unifier
-        :rtype: {Tuple[AbstractSyntaxTree, Tuple[Substitution,Substitution]]}
+        :returns: A FreeVariable replacing node1 and node2
+        :rtype: {FreeVariable}
         """
-        # s and t are 2-tuples
-        assert s[0].getMap().keys() == s[1].getMap().keys()
-        assert t[0].getMap().keys() == t[1].getMap().keys()
-        newt = (copy(t[0]), copy(t[1]))
-        relabel = {}
-        for si in s[0].getMap():
-            if not ignore_parametrization:
-                found = False
-                for ti in t[0].getMap():
-                    # For two trees the same substitution is performed
-                    # This is a pattern of substitution??
-                    if (s[0].getMap()[si] == t[0].getMap()[ti]) and (s[1].getMap()[si] == t[1].getMap()[ti]):
-                        # if s[si] == t[ti]  # the values of substitution is the same
-                        relabel[si] = ti
-                        found = True
-                        break
-            if ignore_parametrization or not found:
-                # Add s[si] to t
-                newt[0].getMap()[si] = s[0].getMap()[si]
-                newt[1].getMap()[si] = s[1].getMap()[si]
-
-        mod_node = Substitution(relabel).substitute(node)
-        return (mod_node, newt)
+        map1 = self._substitutions[0].getMap()
+        map2 = self._substitutions[1].getMap()
+        key = (node1.getFingerprint(), node2.getFingerprint())
+        variables = self._substitutions_index.setdefault(key, [])
+        if not ignore_parametrization:
+            for var in variables:
+                # Fingerprints can collide, check that the trees are the same
+                if map1[var] == node1 and map2[var] == node2:
+                    return var
+        var = FreeVariable()
+        map1[var] = node1
+        map2[var] = node2
+        variables.append(var)
+        return var
 
     def _unify(self, node1, node2, ignore_parametrization):
         """Create anti-unifier for node1 and node2.
 
-        Recursively create an anti-unifier using substitutions.
+        Recursively create an anti-unifier, the substitutions performed are
+        added to self._substitutions.
 
         :param node1: Tree to be anti-unified
         :type node1: AbstractSyntaxTree
@@ -207,35 +199,171 @@ class Unifier(object):
         :type node2: AbstractSyntaxTree
         :param ignore_parametrization: todo:
         :type ignore_parametrization: bool
-        :returns: An anti-unifier and the substitutions performed.
-        :rtype: {Tuple[AbstractSyntaxTree, Tuple[Substitution,Substitution]]}
+        :returns: An anti-unifier.
+        :rtype: {AbstractSyntaxTree}
         """
-        if node1 == node2:
+        if node1.getFingerprint() == node2.getFingerprint() and node1 == node2:
             # Two nodes are the same. From (Bulychev et al., 2008): II. A.
             # [...] the abstract syntax trees we use are not always trees, since
             # leaves containing the same variable references may be merged, [...]
-            return (node1, (Substitution(), Substitution()))
+            return node1
         elif (node1.getName() != node2.getName()) or (node1.getChildCount() != node2.getChildCount()):
             # Nodes are different, replace node1 and node2 by a Free variable
-            var = FreeVariable()
-            return (var, (Substitution({var: node1}), Substitution({var: node2})))
+            return self._combineSubs(node1, node2, ignore_parametrization)
         else:
             # Same name AND number of childs
-            s = (Substitution(), Substitution())
-            name = node1.getName()
-            retNode = AbstractSyntaxTree(name)
-            count = node1.getChildCount()
-            for i in range(count):
+            retNode = AbstractSyntaxTree(node1.getName())
+            childs1 = node1.getChilds()
+            childs2 = node2.getChilds()
+            for i in range(len(childs1)):
                 # Find anti-unifier for the childs
-                (ai, si) = self._unify(
-                    node1.getChilds()[i], node2.getChilds()[i],
-                    ignore_parametrization)
-                # ai: anti-unifier tree
-                # si: substitutions from node1 and node2 to ai
-                (ai, s) = self._combineSubs(
-                    ai, si, s, ignore_parametrization)
-                retNode.addChild(ai)
-            return (retNode, s)
+                ai = self._unify(childs1[i], childs2[i], ignore_parametrization)
+                # Subtrees of node1 are shared with the anti-unifier, do not
+                # change their parent
+                retNode.addChild(ai, save_parent=(ai is childs1[i]))
+            return retNode
+
+
+def _substituted_size(tree):
+    """Return the size `tree` accounts for in a Substitution.
+
+    Same computation as Substitution.getSize for a single value, the size of
+    the tree is only computed the first time it is substituted.
+    """
+    tree.storeSize()
+    return tree.getSize(ignore_none=False) - free_variable_cost
+
+
+def _collect_substitutions(node1, node2, pairs):
+    """Collect the pairs of trees that an anti-unifier would substitute.
+
+    Walk node1 and node2 the same way Unifier._unify does, but only keep the
+    (node1, node2) pairs that would be replaced by a FreeVariable.
+
+    :param pairs: Pairs found so far, if it is an index of the pairs by
+        fingerprints (as in Unifier._combineSubs) equal pairs are merged
+    :type pairs: Union[Dict[Tuple[int, int], List[Tuple]], List[Tuple]]
+    """
+    if node1 is node2:
+        return
+    if (node1.getName() != node2.getName()) or (node1.getChildCount() != node2.getChildCount()):
+        if isinstance(pairs, list):
+            pairs.append((node1, node2))
+            return
+        key = (node1.getFingerprint(), node2.getFingerprint())
+        same_key_pairs = pairs.setdefault(key, [])
+        for (tree1, tree2) in same_key_pairs:
+            if tree1 == node1 and tree2 == node2:
+                return
+        same_key_pairs.append((node1, node2))
+        return
+    # Equal nodes do not produce any pair, no need to check `node1 == node2`
+    childs2 = node2.getChilds()
+    for i, child1 in enumerate(node1.getChilds()):
+        _collect_substitutions(child1, childs2[i], pairs)
+
+
+def unifier_sizes(t1, t2, ignore_parametrization=False):
+    """Compute the sizes of the substitutions of the anti-unifier of t1 and t2.
+
+    Cost-only version of Unifier: the anti-unifier tree, FreeVariables and
+    Substitutions are not built, so that
+    `unifier_sizes(t1, t2) == tuple(s.getSize() for s in Unifier(t1, t2).getSubstitutions())`
+
+    `t1` and `t2` can also be sequences of trees of the same length, they are
+    then considered as the childs of two trees with the same name. This avoids
+    building trees such as StatementSequence.constructTree.
+
+    :param t1: Tree 1
+    :type t1: Union[AbstractSyntaxTree, List[AbstractSyntaxTree]]
+    :param t2: Tree 2
+    :type t2: Union[AbstractSyntaxTree, List[AbstractSyntaxTree]]
+    :param ignore_parametrization: See Unifier, defaults to False
+    :type ignore_parametrization: bool, optional
+    :returns: Size of the substitution of t1 and size of the substitution of t2
+    :rtype: {Tuple[float, float]}
+    """
+    # Like in Unifier._combineSubs, equal substitutions are only counted once
+    pairs = [] if ignore_parametrization else {}
+    if isinstance(t1, AbstractSyntaxTree):
+        _collect_substitutions(t1, t2, pairs)
+    else:
+        assert len(t1) == len(t2)
+        for i in range(len(t1)):
+            _collect_substitutions(t1[i], t2[i], pairs)
+    if not ignore_parametrization:
+        pairs = [pair for same_key_pairs in pairs.values() for pair in same_key_pairs]
+    return pairs_sizes(pairs)
+
+
+def pairs_sizes(pairs):
+    """Return the sizes of the substitutions made of pairs of trees
+
+    :param pairs: Pairs of substituted trees
+    :type pairs: List[Tuple[AbstractSyntaxTree, AbstractSyntaxTree]]
+    :returns: Size of the substitution of the first trees and of the second trees
+    :rtype: {Tuple[float, float]}
+    """
+    size1 = 0
+    size2 = 0
+    for (tree1, tree2) in pairs:
+        size1 += _substituted_size(tree1)
+        size2 += _substituted_size(tree2)
+    return (size1, size2)
+
+
+def statement_substitutions(sequence1, sequence2):
+    """Collect the substitutions of the anti-unifier of two sequences statement by statement
+
+    The pairs of a statement are those Unifier(sequence1[i], sequence2[i])
+    would substitute, equal pairs are not merged.
+
+    :param sequence1: Statements 1
+    :type sequence1: List[AbstractSyntaxTree]
+    :param sequence2: Statements 2, as many as in sequence1
+    :type sequence2: List[AbstractSyntaxTree]
+    :returns: For every statement, the pairs of trees substituted in it
+    :rtype: {List[List[Tuple[AbstractSyntaxTree, AbstractSyntaxTree]]]}
+    """
+    assert len(sequence1) == len(sequence2)
+    substitutions = []
+    for i in range(len(sequence1)):
+        pairs = []
+        _collect_substitutions(sequence1[i], sequence2[i], pairs)
+        substitutions.append(pairs)
+    return substitutions
+
+
+def substitutions_size(substitutions):
+    """Compute the size of the anti-unifier of two sequences from their substitutions
+
+    Equal pairs are merged as in unifier_sizes, so that
+    `substitutions_size(statement_substitutions(s1, s2)) == unifier_size(s1, s2)`
+
+    :param substitutions: Substitutions, see statement_substitutions
+    :type substitutions: List[List[Tuple[AbstractSyntaxTree, AbstractSyntaxTree]]]
+    :returns: Size of the anti-unifier
+    :rtype: {float}
+    """
+    index = {}
+    for pairs in substitutions:
+        for (node1, node2) in pairs:
+            key = (node1.getFingerprint(), node2.getFingerprint())
+            same_key_pairs = index.setdefault(key, [])
+            for (tree1, tree2) in same_key_pairs:
+                if tree1 == node1 and tree2 == node2:
+                    break
+            else:
+                same_key_pairs.append((node1, node2))
+    return sum(pairs_sizes([pair for same_key_pairs in index.values() for pair in same_key_pairs]))
+
+
+def unifier_size(t1, t2, ignore_parametrization=False):
+    """Compute Unifier(t1, t2).getSize() without building the anti-unifier.
+
+    See unifier_sizes.
+    """
+    return sum(unifier_sizes(t1, t2, ignore_parametrization))
 
 
 class Cluster(object):
@@ -253,6 +381,7 @@ class Cluster(object):
         self._unifier_tree = None  # Anti-unifier of trees in cluster, if added via self.unify()
         self._trees = []  # List of trees in cluster
         self._max_covered_lines = 0  # Maximum lines covered by a tree in the cluster
+        self._unifier_sizes = {}  # id(tree) -> unifier_sizes(unifier_tree, tree)
         if tree:
             self._n = 1
             self._trees = [tree]
@@ -271,15 +400,76 @@ class Cluster(object):
     def getCount(self):
         return self._n
 
+    def getUnifierSizes(self, tree):
+        """Compute the sizes of the substitutions of the anti-unifier of the
+        cluster's unifier and `tree`.
+
+        The sizes are cached until the unifier of the cluster changes, so that
+        clustering steps evaluating the same tree against the same cluster
+        (build_unifiers and clusterize) anti-unify them only once.
+
+        :param tree: tree
+        :type tree: AbstractSyntaxTree
+        :returns: Sizes of the substitutions, see unifier_sizes
+        :rtype: {Tuple[float, float]}
+        """
+        key = id(tree)
+        if key not in self._unifier_sizes:
+            self._unifier_sizes[key] = unifier_sizes(self.getUnifierTree(), tree)
+        return self._unifier_sizes[key]
+
+    def clearUnifierSizes(self):
+        """Free the sizes cached by getUnifierSizes."""
+        self._unifier_sizes = {}
+
     def getAddCost(self, tree):
         """Compute the cost of adding a tree to the cluster.
 
         :param tree: tree
         :type tree: AbstractSyntaxTree
         """
-        unifier = Unifier(self.getUnifierTree(), tree)
+        (size1, size2) = self.getUnifierSizes(tree)
         # TODO: shouldn't this be count * (sub[0] + sub[1]) ??
-        return (self.getCount() * unifier.getSubstitutions()[0].getSize() + unifier.getSubstitutions()[1].getSize())
+        return (self.getCount() * size1 + size2)
+
+    def _leafNamesLowerBound(self, tree, count, limit):
+        """Compute a lower bound of `count * size1 + size2` where size1 and
+        size2 are the sizes of self.getUnifierSizes(tree).
+
+        A leaf name that is only in one of the trees must be in a substituted
+        subtree, and a substituted subtree costs at least half of its distinct
+        leaf names.
+        """
+        names1 = self.getUnifierTree().getLeafNames()
+        names2 = tree.getLeafNames()
+        bound = 0.5 * (count * max(0, len(names1) - len(names2)) +
+                       max(0, len(names2) - len(names1)))
+        if limit is not None and bound > limit:
+            return bound
+        return 0.5 * (count * len(names1 - names2) + len(names2 - names1))
+
+    def getAddCostLowerBound(self, tree, limit=None):
+        """Compute a lower bound of the cost of adding a tree to the cluster.
+
+        This is cheaper than getAddCost as it only uses the cached leaf names
+        of the trees.
+
+        :param tree: tree
+        :type tree: AbstractSyntaxTree
+        :param limit: If the bound computed from the number of leaf names
+            exceeds limit, return it without comparing the names, defaults to None
+        :type limit: float, optional
+        :returns: A value lower or equal to self.getAddCost(tree)
+        :rtype: {float}
+        """
+        return self._leafNamesLowerBound(tree, self.getCount(), limit)
+
+    def getUnifierSizeLowerBound(self, tree, limit=None):
+        """Compute a lower bound of `sum(self.getUnifierSizes(tree))`.
+
+        See getAddCostLowerBound.
+        """
+        return self._leafNamesLowerBound(tree, 1, limit)
 
     # Set tree
 
@@ -291,7 +481,10 @@ class Cluster(object):
         """
         # TODO: why isn't self._max_covered_lines updated here ?
         self._n += 1
-        self._unifier_tree = Unifier(self.getUnifierTree(), tree).getUnifier()
+        unifier_tree = Unifier(self.getUnifierTree(), tree).getUnifier()
+        if unifier_tree is not self._unifier_tree:
+            self._unifier_tree = unifier_tree
+            self.clearUnifierSizes()
         self._trees.append(tree)
 
     def addWithoutUnification(self, tree):
@@ -313,3 +506,12 @@ class Cluster(object):
 
     def getUnifierTree(self):
         return self._unifier_tree
+
+    def setUnifierTree(self, tree):
+        """Set the unifier of a cluster populated without unification.
+
+        :param tree: Tree
+        :type tree: AbstractSyntaxTree
+        """
+        self._unifier_tree = tree
+        self.clearUnifierSizes()
@@ -14,11 +14,18 @@ from builtins import object"""
 # This file is used as a namespace to hold useful arguments from the CLI
 
 clustering_threshold = None
+clustering_jobs = 1  # Number of processes used to build patterns
+clustering_engine = 'greedy'  # How statements are grouped before clustering
+lsh_bits = 16  # Number of bits of LSH signatures, for the lsh engine
 clusterize_using_dcup = None  # How to compute hash and ?
 clusterize_using_hash = None  # How to compute hash and ?
 hashing_depth = None  # How to compute hash if ?
+max_bucket_size = None  # Split larger hash buckets using deeper hashes
 force = None  # Process big statements and ?
+window_long_sequences = None  # Split long sequences of statements into windows
 use_diff = None
+diff_highlighting = 'lines'  # How use_diff aligns the fragments: 'lines' or 'chars'
+report_jobs = 1  # Number of processes used to render the HTML report
 print_time = None
 report_unifiers = None
 eclipse_output = None
@@ -32,13 +39,15 @@ size_threshold = None  # Minimal size of statements
 # abstract_syntax_tree.getAllStatementSequences :
 #    size_threshold
 # clone_detection_algorithm.py :
-#    clustering_threshold, clusterize_using_dcup, clusterize_using_hash,
-#    hashing_depth, force,
-#    report_unifiers,
+#    clustering_threshold, clustering_jobs, clustering_engine, lsh_bits,
+#    clusterize_using_dcup,
+#    clusterize_using_hash, hashing_depth, max_bucket_size, force,
+#    window_long_sequences, report_unifiers,
 #    distance_threshold, size_threshold,
 # reports.py :
 #    clustering_threshold, clusterize_using_dcup, clusterize_using_hash,
-#    hashing_depth, use_diff, print_time
+#    hashing_depth, max_bucket_size, use_diff, diff_highlighting, report_jobs,
+#    print_time
 #    distance_threshold, size_threshold
 
 # All options are set here to be used everywhere -> define a dictionnary and pass it as `context` or whathever
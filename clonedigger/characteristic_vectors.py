@@ -0,0 +1,148 @@
+#    This file is part of Clone Digger.
+#
+#    Clone Digger is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Clone Digger is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with Clone Digger.  If not, see <http://www.gnu.org/licenses/>.
+
+"""characteristic_vectors module
+
+Group statements using locality-sensitive hashing of characteristic vectors,
+as an alternative to grouping them by dcup hash before clustering.
+
+Every statement is represented by a vector counting its node names and its
+(parent name, child name) bigrams, hashed into VECTOR_SIZE dimensions. The
+names of leaves (identifiers, constants) are not used, the differences they
+make are handled by anti-unification. Statements are then grouped by the
+signs of random projections of their vectors (random hyperplane LSH), so
+statements with similar vectors are likely to get the same signature.
+
+Requires NumPy.
+"""
+
+import zlib
+import logging
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+VECTOR_SIZE = 128  #: Number of dimensions of the characteristic vectors
+CHUNK_SIZE = 65536  #: Number of vectors projected at once
+MAX_BITS = 62  #: Maximum number of bits of the signatures, they are int64
+LEAF = '__LEAF__'  #: Name used in place of leaf names
+
+
+def feature_index(*names):
+    """Return the index of a feature in the characteristic vectors
+
+    A CRC32 is used instead of the builtin hash, whose value depends on the
+    interpreter, the platform and the hash randomization, so the vectors are
+    the same for every run.
+
+    :param names: Node names identifying the feature
+    :type names: List[str]
+    :rtype: {int}
+    """
+    key = '\0'.join([str(name) for name in names]).encode('utf-8')
+    # Masked to be positive on Python 2
+    return (zlib.crc32(key) & 0xffffffff) % VECTOR_SIZE
+
+
+def statement_features(statement):
+    """Return the indexes of the features of a statement.
+
+    An index is returned for every node and every (parent, child) pair, so the
+    count of an index in the list is the value of the vector at this index.
+
+    :param statement: Statement
+    :type statement: AbstractSyntaxTree
+    :returns: Indexes in the characteristic vector
+    :rtype: {List[int]}
+    """
+    features = []
+    stack = [statement]
+    while stack:
+        t = stack.pop()
+        if t.getChildCount():
+            name = t.getName()
+            features.append(feature_index(name))
+            for child in t.getChilds():
+                child_name = child.getName() if child.getChildCount() else LEAF
+                features.append(feature_index(name, child_name))
+            stack.extend(t.getChilds())
+        else:
+            features.append(feature_index(LEAF))
+    return features
+
+
+def build_lsh_signatures(statements, bits, seed=0):
+    """Compute the LSH signature of every statement.
+
+    The characteristic vectors are built and projected by chunks of
+    CHUNK_SIZE statements to bound the memory used.
+
+    :param statements: Statements
+    :type statements: List[AbstractSyntaxTree]
+    :param bits: Number of bits of the signatures (at most MAX_BITS)
+    :type bits: int
+    :param seed: Seed of the random projections, defaults to 0
+    :type seed: int, optional
+    :returns: The signature of every statement
+    :rtype: {List[int]}
+    """
+    if numpy is None:
+        raise ImportError('NumPy is required by the lsh clustering engine')
+    assert 0 < bits <= MAX_BITS
+    projections = numpy.random.RandomState(seed).normal(
+        size=(VECTOR_SIZE, bits)).astype(numpy.float32)
+    powers = numpy.left_shift(numpy.int64(1), numpy.arange(bits, dtype=numpy.int64))
+    signatures = []
+    for start in range(0, len(statements), CHUNK_SIZE):
+        chunk = statements[start:start + CHUNK_SIZE]
+        rows = []
+        cols = []
+        for (i, statement) in enumerate(chunk):
+            features = statement_features(statement)
+            rows.extend([i] * len(features))
+            cols.extend(features)
+        flat = numpy.array(rows, dtype=numpy.int64) * VECTOR_SIZE + numpy.array(cols, dtype=numpy.int64)
+        vectors = numpy.bincount(flat, minlength=len(chunk) * VECTOR_SIZE)
+        vectors = vectors.reshape((len(chunk), VECTOR_SIZE)).astype(numpy.float32)
+        chunk_bits = numpy.dot(vectors, projections) > 0
+        signatures.extend(numpy.dot(chunk_bits.astype(numpy.int64), powers).tolist())
+    return signatures
+
+
+def build_lsh_to_statement(statement_sequences, bits):
+    """Group statements by the LSH signature of their characteristic vectors
+
+    Can be used in place of clone_detection_algorithm.build_hash_to_statement
+    before build_unifiers and clusterize.
+
+    :param statement_sequences: Statements to group
+    :type statement_sequences: List[StatementSequence]
+    :param bits: Number of bits of the signatures, more bits make smaller groups
+    :type bits: int
+    :returns: A map Signature -> List[Statement]
+    :rtype: {Dict[int -> List[Statement]]}
+    """
+    statements = [statement for sequence in statement_sequences for statement in sequence]
+    signatures = build_lsh_signatures(statements, bits)
+    lsh_to_statement = {}
+    for (signature, statement) in zip(signatures, statements):
+        if signature not in lsh_to_statement:
+            lsh_to_statement[signature] = [statement]
+        else:
+            lsh_to_statement[signature].append(statement)
+    logging.info('Number of different LSH signatures: {}'.format(len(lsh_to_statement)))
+    return lsh_to_statement
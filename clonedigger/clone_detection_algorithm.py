@@ -31,17 +31,22 @@ from past.utils import old_div"""
 
 import sys
 import logging
-import copy
+import multiprocessing
+from array import array
 
 from . import arguments
 from . import suffix_tree
-from .anti_unification import Cluster, Unifier
-from .abstract_syntax_tree import StatementSequence, PairSequences
+from . import characteristic_vectors
+from .anti_unification import Cluster, pairs_sizes
+from .abstract_syntax_tree import AbstractSyntaxTree, StatementSequence, PairSequences, CloneClass
 
 MAX_SEQUENCE_LENGTH = 1000
+WINDOW_LENGTH = 100  # Length of the windows of the sequences longer than MAX_SEQUENCE_LENGTH
+WINDOW_OVERLAP = 25  # Statements shared by consecutive windows of a long sequence
+MAX_EQUALLY_LABELED_LENGTH = 11  # Longer runs of equally labeled statements are ignored
 
 
-def build_hash_to_statement(statement_sequences, dcup_hash=True):
+def build_hash_to_statement(statement_sequences, dcup_hash=True, max_bucket_size=None):
     """Compute hash for every statement
 
     Two statement can have the same hash
@@ -50,6 +55,9 @@ def build_hash_to_statement(statement_sequences, dcup_hash=True):
     :type statement_sequences: List[StatementSequence]
     :param dcup_hash: Use dcup hash, defaults to True
     :type dcup_hash: bool, optional
+    :param max_bucket_size: If set, split the buckets holding more statements
+        using deeper dcup hashes, see split_large_buckets, defaults to None
+    :type max_bucket_size: int, optional
     :returns: A map Hash -> List[Statement]
     :rtype: {Dict[int -> List[Statement]]}
     """
@@ -65,10 +73,87 @@ def build_hash_to_statement(statement_sequences, dcup_hash=True):
                 hash_to_statement[h] = [statement]
             else:
                 hash_to_statement[h].append(statement)
+    if dcup_hash and max_bucket_size:
+        hash_to_statement = split_large_buckets(
+            hash_to_statement, arguments.hashing_depth, max_bucket_size)
     return hash_to_statement
 
 
-def build_unifiers(hash_to_statement):
+def build_hash_labels(statement_sequences, dcup_hash=True):
+    """Mark every statement with an integer label of its hash
+
+    Same grouping as build_hash_to_statement, but statements are not gathered
+    in lists: each different hash value gets the next integer label, which is
+    used as the mark of the statement. Used when statements are marked with
+    their hash value (--fast, --clusterize-using-dcup), so no Cluster is needed.
+
+    :param statement_sequences: Statements to mark
+    :type statement_sequences: List[StatementSequence]
+    :param dcup_hash: Use dcup hash, defaults to True
+    :type dcup_hash: bool, optional
+    :returns: The maximum number of lines covered by a statement of each label
+    :rtype: {array}
+    """
+    hash_to_label = {}
+    max_covered_lines = array('i')
+    for statement_sequence in statement_sequences:
+        for statement in statement_sequence:
+            if dcup_hash:
+                h = statement.getDCupHash(arguments.hashing_depth)
+            else:
+                h = statement.getFullHash()
+            label = hash_to_label.get(h)
+            if label is None:
+                label = len(max_covered_lines)
+                hash_to_label[h] = label
+                max_covered_lines.append(0)
+            statement.setMark(label)
+            covered_lines = len(statement.getCoveredLineNumbers())
+            if covered_lines > max_covered_lines[label]:
+                max_covered_lines[label] = covered_lines
+    return max_covered_lines
+
+
+def split_large_buckets(hash_to_statement, hashing_depth, max_bucket_size):
+    """Recursively split the buckets that hold too many statements
+
+    A bucket holding more than `max_bucket_size` statements is split using the
+    dcup hash of the next depth, until it is small enough or the depth reaches
+    the height of its statements (the dcup hash is then the full hash). Small
+    buckets keep the hash of `hashing_depth`. The keys of split buckets are
+    tuples (key of the bucket, deeper hash).
+
+    :param hash_to_statement: Statements grouped by dcup hash of `hashing_depth`
+    :type hash_to_statement: Dict[int, List[AbstractSyntaxTree]]
+    :param hashing_depth: Depth of the hashes of `hash_to_statement`
+    :type hashing_depth: int
+    :param max_bucket_size: Number of statements above which a bucket is split
+    :type max_bucket_size: int
+    :returns: A map Hash -> List[Statement]
+    :rtype: {Dict[Union[int, Tuple] -> List[Statement]]}
+    """
+    ret = {}
+    buckets = [(h, statements, hashing_depth) for (h, statements) in hash_to_statement.items()]
+    while buckets:
+        (h, statements, depth) = buckets.pop()
+        if len(statements) <= max_bucket_size or depth < 0 or \
+                depth >= max([s.getHeight() for s in statements]):
+            ret[h] = statements
+            continue
+        depth += 1
+        sub_buckets = {}
+        for statement in statements:
+            sub_h = statement.getDCupHash(depth)
+            if sub_h not in sub_buckets:
+                sub_buckets[sub_h] = [statement]
+            else:
+                sub_buckets[sub_h].append(statement)
+        for (sub_h, sub_statements) in sub_buckets.items():
+            buckets.append(((h, sub_h), sub_statements, depth))
+    return ret
+
+
+def build_unifiers(hash_to_statement, progress=None):
     """Populate Cluster object with Statement.
 
     Greedily add the cheapest statement to Clusters by unifying, thus creating
@@ -76,10 +161,14 @@ def build_unifiers(hash_to_statement):
 
     :param hash_to_statement: Statements grouped by hash
     :type hash_to_statement: Dict[int, List[AbstractSyntaxTree]]
+    :param progress: Called with the number of processed statements and the
+        number of statements, defaults to None
+    :type progress: Function[int, int], optional
     :returns: A list of unified Cluster
     :rtype: {Dict[int, Cluster]}
     """
     processed_statements_count = 0
+    statement_count = sum([len(statements) for statements in hash_to_statement.values()])
     clusters = []
     ret = {}
     for h in list(hash_to_statement.keys()):
@@ -88,8 +177,8 @@ def build_unifiers(hash_to_statement):
         statements = hash_to_statement[h]
         for statement in statements:
             processed_statements_count += 1
-            if (processed_statements_count % 1000) == 0:
-                logging.info('{},'.format(processed_statements_count))
+            if progress is not None:
+                progress(processed_statements_count, statement_count)
 
             # Fig 1. in (Bulychev et al., 2008)
             # Compute the local cluster that has the lowest cost of adding the
@@ -97,11 +186,16 @@ def build_unifiers(hash_to_statement):
             bestcluster = None
             mincost = sys.maxsize
             for cluster in local_clusters:
+                # Skip clusters that can not be better than the current best
+                #  one, or that would be rejected by the clustering threshold
+                lower_bound = cluster.getAddCostLowerBound(
+                    statement, min(mincost, arguments.clustering_threshold))
+                if lower_bound >= mincost or lower_bound > arguments.clustering_threshold:
+                    continue
                 cost = cluster.getAddCost(statement)
                 if cost < mincost:
                     mincost = cost
                     bestcluster = cluster
-            assert(local_clusters == [] or bestcluster)
 
             # The minimum cost should not be <0 (how would this be possible ??)
             # mincost is (len(cluster) * len(cluster.unifier.subs[0]) + len(cluster.unifier.subs[1]))
@@ -122,20 +216,23 @@ def build_unifiers(hash_to_statement):
     return ret
 
 
-def clusterize(hash_to_statement, clusters_map):
-    """Add statements to Cluster's unifier
+def clusterize(hash_to_statement, clusters_map, progress=None):
+    """Mark each statement with the cluster whose unifier is the closest
 
-    Greedily add statements to cluster based on distance to Cluster's unifier
+    The unifier sizes computed by build_unifiers against clusters that did not
+    change afterwards are reused (see Cluster.getUnifierSizes), and each
+    statement is added once, to the cluster it is marked with.
 
     :param hash_to_statement: Statements grouped by hash
     :type hash_to_statement: Dict[int, List[Statement]]
     :param clusters_map: Clusters grouped by hash
     :type clusters_map: Dict[int, List[Cluster]]
+    :param progress: Called with the number of processed statements and the
+        number of statements, defaults to None
+    :type progress: Function[int, int], optional
     """
-    # Are the same Statements added to the same clusters than in build_unifiers ??
-    # What does this function do more than just calling setMark on statements
-
     processed_statements_count = 0
+    statement_count = sum([len(statements) for statements in hash_to_statement.values()])
     # clusters_map contain hash values for statements, not unifiers
     # therefore it will work correct even if unifiers are smaller than hashing depth value
     for h in hash_to_statement:
@@ -143,30 +240,128 @@ def clusterize(hash_to_statement, clusters_map):
         clusters = clusters_map[h]
         for statement in hash_to_statement[h]:
             processed_statements_count += 1
-            if (processed_statements_count % 1000) == 0:
-                logging.info('{},'.format(processed_statements_count))
+            if progress is not None:
+                progress(processed_statements_count, statement_count)
+            bestcluster = None
             mincost = sys.maxsize
             for cluster in clusters:
-                # For each local_cluster add statement if adding it is cheap
-                # But the statement will always be added to the first local_cluster,
-                #  and the last will likely be never
-
-                # TODO: should this be cluster.getAddCost(statement)
-                new_u = Unifier(cluster.getUnifierTree(), statement)
-                # assert(new_u.getSubstitutions()[0].getSize() == 0)
-                cost = new_u.getSize()
+                # The first cluster with the lowest cost is chosen
+                if cluster.getUnifierSizeLowerBound(statement, mincost) >= mincost:
+                    continue
+                cost = sum(cluster.getUnifierSizes(statement))
                 if cost < mincost:
-                    # statement.setMark can only hold one value
-                    # The statement can be theoretically added to multiple
-                    #  clusters (is this the case?)
-                    # This will result in statement occuring in multiple cluster,
-                    #  but statement will belong to only one (according to stmt._mark)
                     mincost = cost
-                    statement.setMark(cluster)
-                    cluster.addWithoutUnification(statement)
-                    # It this the wanted behaviour ?
-                    # Why not creating new Cluster objects ? The same statement
-                    #  can be added once in build_unifiers and once again in here
+                    bestcluster = cluster
+            statement.setMark(bestcluster)
+            bestcluster.addWithoutUnification(statement)
+        for cluster in clusters:
+            cluster.clearUnifierSizes()
+
+
+# Statements grouped by hash, inherited by the workers of clusterize_in_parallel
+_parallel_hash_to_statement = None
+
+
+def _tree_to_tuples(tree):
+    return (tree.getName(), tuple([_tree_to_tuples(c) for c in tree.getChilds()]))
+
+
+def _tuples_to_tree(tuples):
+    tree = AbstractSyntaxTree(tuples[0])
+    for child in tuples[1]:
+        tree.addChild(_tuples_to_tree(child))
+    return tree
+
+
+def _clusterize_bucket(h):
+    """Cluster the statements of one hash bucket, in a worker process.
+
+    :param h: Hash of the bucket in `_parallel_hash_to_statement`
+    :type h: int
+    :returns: The hash, the index of the cluster of every statement of the
+        bucket and, if arguments.report_unifiers, the unifiers of the clusters
+    :rtype: {Tuple[int, array, Union[None, List[Tuple]]]}
+    """
+    bucket = {h: _parallel_hash_to_statement[h]}
+    clusters_map = build_unifiers(bucket)
+    clusterize(bucket, clusters_map)
+    cluster_ids = dict([(id(cluster), i) for (i, cluster) in enumerate(clusters_map[h])])
+    marks = array('i', [cluster_ids[id(statement.getMark())] for statement in bucket[h]])
+    unifiers = None
+    if arguments.report_unifiers:
+        unifiers = [_tree_to_tuples(cluster.getUnifierTree()) for cluster in clusters_map[h]]
+    return (h, marks, unifiers)
+
+
+def clusterize_in_parallel(hash_to_statement, jobs, progress=None):
+    """Same as build_unifiers followed by clusterize, using several processes
+
+    Hash buckets are clustered independently, so they are distributed over a
+    pool of `jobs` processes, largest buckets first. The workers are forked,
+    they read the statements from the memory of this process and only send
+    back the index of the cluster of each statement. The Cluster objects are
+    then created here in the order of the buckets, and the statements marked.
+
+    If processes can not be forked, the clustering is done in this process.
+
+    :param hash_to_statement: Statements grouped by hash
+    :type hash_to_statement: Dict[int, List[AbstractSyntaxTree]]
+    :param jobs: Number of processes
+    :type jobs: int
+    :param progress: Called with the number of statements of the clustered
+        buckets and the number of statements, defaults to None
+    :type progress: Function[int, int], optional
+    """
+    global _parallel_hash_to_statement
+    try:
+        context = multiprocessing.get_context('fork')
+    except AttributeError:
+        # Python 2, processes are always forked
+        context = multiprocessing
+    except ValueError:
+        logging.warning('Processes can not be forked, clustering with one process')
+        clusterize(hash_to_statement, build_unifiers(hash_to_statement, progress), progress)
+        return
+
+    # A bucket with one statement is a cluster, do not send it to a worker
+    hashes = [h for h in hash_to_statement if len(hash_to_statement[h]) > 1]
+    hashes.sort(key=lambda h: len(hash_to_statement[h]), reverse=True)
+    processed_statements_count = len(hash_to_statement) - len(hashes)
+    statement_count = sum([len(statements) for statements in hash_to_statement.values()])
+
+    results = {}  # Hash -> (marks, unifiers)
+    _parallel_hash_to_statement = hash_to_statement
+    pool = context.Pool(jobs)
+    try:
+        chunksize = max(1, len(hashes) // (jobs * 16))
+        for (h, marks, unifiers) in pool.imap_unordered(_clusterize_bucket, hashes, chunksize):
+            results[h] = (marks, unifiers)
+            processed_statements_count += len(marks)
+            if progress is not None:
+                progress(processed_statements_count, statement_count)
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+        _parallel_hash_to_statement = None
+
+    # Clusters are created in the order of the buckets, as build_unifiers
+    #  does, so they are numbered the same whatever the number of processes
+    for h in hash_to_statement:
+        if h not in results:
+            statement = hash_to_statement[h][0]
+            statement.setMark(Cluster(statement))
+            continue
+        (marks, unifiers) = results.pop(h)
+        clusters = [Cluster() for _ in range(max(marks) + 1)]
+        if unifiers is not None:
+            for (cluster, unifier) in zip(clusters, unifiers):
+                cluster.setUnifierTree(_tuples_to_tree(unifier))
+        for (statement, mark) in zip(hash_to_statement[h], marks):
+            statement.setMark(clusters[mark])
+            clusters[mark].addWithoutUnification(statement)
 
 
 def filterOutLongSequences(statement_sequences, max_length):
@@ -181,7 +376,7 @@ def filterOutLongSequences(statement_sequences, max_length):
                 stmt.getSourceFile().getFileName(),
                 min(stmt.getCoveredLineNumbers()),
                 len(seq)))
-        logging.info('It will be ignored. Use --force to override this restriction.')
+        logging.info('It will be ignored. Use --force or --window-long-sequences to override this restriction.')
         logging.info('Please refer to http://clonedigger.sourceforge.net/documentation.html')
         logging.info('-----------------------------------------')
 
@@ -194,169 +389,462 @@ def filterOutLongSequences(statement_sequences, max_length):
     return sequences
 
 
-def filterOutLongEquallyLabeledSequences(statement_sequences):
+def splitLongSequences(statement_sequences, max_length, overlap, window_length=None):
+    """Split sequences longer than max_length into overlapping windows
 
-    def print_warn(stmt):
-        # This function is defined here to clear the body of the function
-        logging.info('-----------------------------------------')
-        logging.info(
-            'Warning: sequence of statements starting at {}:{} consists of many '
-            'similar statements.'.format(
-                stmt.getSourceFile().getFileName(),
-                min(stmt.getCoveredLineNumbers())))
-        logging.info('It will be ignored. Use --force to override this restriction.')
-        logging.info('Please refer to http://clonedigger.sourceforge.net/documentation.html')
-        logging.info('-----------------------------------------')
+    Consecutive windows share `overlap` statements, so a repeated sequence of
+    at most `overlap` statements is found entirely in one window, and a longer
+    one is found as overlapping parts that stitchWindowedCandidates joins.
 
-    # TODO - refactor, combine with the previous warning
-    sequences_without_restriction = statement_sequences
-    statement_sequences = []
-    for sequence in sequences_without_restriction:
-        new_sequence = copy.copy(sequence._sequence)
-        current_mark = None
-        length = 0
-        first_statement_index = None
-        flag = False
-        for i in range(len(sequence)):
-            statement = sequence[i]
-            if statement.getMark() != current_mark:
-                if flag is True:
-                    flag = False
-                current_mark = statement.getMark()
-                length = 0
-                first_statement_index = i
+    :param statement_sequences: Sequences of statements
+    :type statement_sequences: List[StatementSequence]
+    :param max_length: Maximum length of a sequence which is not split
+    :type max_length: int
+    :param overlap: Number of statements shared by consecutive windows
+    :type overlap: int
+    :param window_length: Length of the windows, defaults to max_length
+    :type window_length: int, optional
+    :returns: Sequences of at most max_length statements
+    :rtype: {List[StatementSequence]}
+    """
+    if window_length is None:
+        window_length = max_length
+    assert 0 <= overlap < window_length
+    sequences = []
+    for sequence in statement_sequences:
+        if len(sequence) <= max_length:
+            sequences.append(sequence)
+            continue
+        logging.info('Sequence of {} statements starting at {}:{} is split into windows'.format(
+            len(sequence), sequence.getSourceFile().getFileName(),
+            min(sequence[0].getCoveredLineNumbers())))
+        for first in range(0, len(sequence) - overlap, window_length - overlap):
+            sequences.append(sequence.getSlice(first, first + window_length))
+    return sequences
+
+
+def stitchWindowedCandidates(candidates, statement_sequences, max_length):
+    """Join the candidates found in the windows made by splitLongSequences
+
+    A candidate is a pair of fragments of `statement_sequences` with the same
+    marks. Candidates whose fragments are at the same distance from each
+    other in the same sequences (the same diagonal) and that overlap or touch
+    are parts of one candidate split by windows, they are merged into one
+    candidate. A fragment found in the overlap of two windows and paired with
+    itself is dropped. Candidates in sequences that were not split are kept
+    as they are.
+
+    :param candidates: Candidates found in the windows
+    :type candidates: List[PairSequences]
+    :param statement_sequences: Sequences before they were split
+    :type statement_sequences: List[StatementSequence]
+    :param max_length: max_length given to splitLongSequences
+    :type max_length: int
+    :returns: Candidates
+    :rtype: {List[PairSequences]}
+    """
+    positions = {}  # id(statement) -> (index of sequence, index in sequence)
+    for (sequence_index, sequence) in enumerate(statement_sequences):
+        for (i, statement) in enumerate(sequence):
+            positions[id(statement)] = (sequence_index, i)
+
+    ret = []
+    diagonals = {}  # (sequence 1, sequence 2, offset) -> List[(first, end)]
+    for candidate in candidates:
+        ((s1, i1), (s2, i2)) = sorted([positions[id(sequence[0])] for sequence in candidate])
+        if len(statement_sequences[s1]) <= max_length and len(statement_sequences[s2]) <= max_length:
+            ret.append(candidate)
+            continue
+        if (s1, i1) == (s2, i2):
+            continue
+        diagonals.setdefault((s1, s2, i2 - i1), []).append((i1, i1 + candidate.getLength()))
+
+    for ((s1, s2, offset), intervals) in sorted(diagonals.items()):
+        intervals.sort()
+        merged = [list(intervals[0])]
+        for (first, end) in intervals[1:]:
+            if first <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
             else:
-                length += 1
-                if length > 10:
-                    new_sequence[i] = None
-                    if not flag:
-                        for i in range(first_statement_index, i):
-                            new_sequence[i] = None
-                        print_warn(sequence[first_statement_index])
-                        flag = True
-        new_sequence = new_sequence + [None]
-        cur_sequence = StatementSequence()
-        for statement in new_sequence:
-            if statement is None:
-                if cur_sequence:
-                    statement_sequences.append(cur_sequence)
-                    cur_sequence = StatementSequence()
+                merged.append([first, end])
+        for (first, end) in merged:
+            ret.append(PairSequences([
+                statement_sequences[s1].getSlice(first, end),
+                statement_sequences[s2].getSlice(first + offset, end + offset)]))
+    return ret
+
+
+def splitAtEquallyLabeledRuns(sequence, max_length=MAX_EQUALLY_LABELED_LENGTH):
+    """Yield the fragments of a sequence between runs of equally labeled statements
+
+    The sequence is walked once, run of equal marks by run. Runs of more than
+    `max_length` statements are dropped and a warning is printed for each of
+    them. If no run is dropped, the sequence itself is yielded.
+
+    :param sequence: Sequence of marked statements
+    :type sequence: StatementSequence
+    :param max_length: Maximum number of equally labeled statements in a row
+    :type max_length: int
+    :returns: Fragments of the sequence
+    :rtype: {Iterator[StatementSequence]}
+    """
+    statements = sequence.getStatements()
+    first = 0  # First statement of the current fragment
+    run_start = 0
+    for i in range(1, len(statements) + 1):
+        if i < len(statements) and statements[i].getMark() == statements[run_start].getMark():
+            continue
+        # The run [run_start, i) ends here
+        if i - run_start > max_length:
+            stmt = statements[run_start]
+            logging.info('-----------------------------------------')
+            logging.info(
+                'Warning: sequence of statements starting at {}:{} consists of many '
+                'similar statements.'.format(
+                    stmt.getSourceFile().getFileName(),
+                    min(stmt.getCoveredLineNumbers())))
+            logging.info('It will be ignored. Use --force to override this restriction.')
+            logging.info('Please refer to http://clonedigger.sourceforge.net/documentation.html')
+            logging.info('-----------------------------------------')
+            if run_start > first:
+                yield sequence.getSlice(first, run_start)
+            first = i
+        run_start = i
+    if first == 0 and statements:
+        yield sequence
+    elif first < len(statements):
+        yield sequence.getSlice(first, len(statements))
+
+
+def filterOutLongEquallyLabeledSequences(statement_sequences):
+    """Split sequences at runs of more than MAX_EQUALLY_LABELED_LENGTH equally labeled statements
+
+    :param statement_sequences: Sequences of marked statements
+    :type statement_sequences: List[StatementSequence]
+    :returns: Sequences without long runs of equally labeled statements
+    :rtype: {List[StatementSequence]}
+    """
+    return [fragment
+            for sequence in statement_sequences
+            for fragment in splitAtEquallyLabeledRuns(sequence)]
+
+
+def filterOutSingletonStatements(statement_sequences, f_size):
+    """Split sequences at statements whose mark occurs only once
+
+    Such a statement can not be part of a repeated sequence of marks, so it
+    can not be part of a candidate clone. The sequences are split around it,
+    and the fragments that can not cover `arguments.size_threshold` lines are
+    dropped. As the other fragment of a candidate may cover more lines, a
+    fragment is only dropped if the sum of the maximum number of lines covered
+    by its marks is below the threshold.
+
+    :param statement_sequences: Sequences of marked statements
+    :type statement_sequences: List[StatementSequence]
+    :param f_size: Maximum number of lines covered by a statement with a given mark
+    :type f_size: Function[Mark -> int]
+    :returns: Sequences without statements with a unique mark
+    :rtype: {List[StatementSequence]}
+    """
+    mark_count = {}
+    for sequence in statement_sequences:
+        for statement in sequence:
+            mark = statement.getMark()
+            mark_count[mark] = mark_count.get(mark, 0) + 1
+
+    sequences = []
+    removed_statements_count = 0
+    for sequence in statement_sequences:
+        first = 0
+        size = 0
+        for i in range(len(sequence) + 1):
+            if i < len(sequence):
+                mark = sequence[i].getMark()
+                if mark_count[mark] > 1:
+                    size += f_size(mark)
+                    continue
+            # The fragment [first, i) ends at a singleton or at the end of the sequence
+            if size >= arguments.size_threshold:
+                if first == 0 and i == len(sequence):
+                    sequences.append(sequence)
+                else:
+                    sequences.append(sequence.getSlice(first, i))
             else:
-                cur_sequence.addStatement(statement)
-    return statement_sequences
+                removed_statements_count += i - first
+            removed_statements_count += i < len(sequence)
+            first = i + 1
+            size = 0
+    logging.info('{} statements can not be part of a clone and were removed'.format(
+        removed_statements_count))
+    return sequences
 
 
 # TODO: rename to findCandidateClones
 # TODO: add threshold argument to explicitly say what this function does
-def findHugeSequences(statement_sequences):
+def findHugeSequences(statement_sequences, f_size=None):
     """Return candidate clones which cover at least `arguments.size_threshold` lines
 
     Use a suffixTree to find candidate clones.
 
     :param statement_sequences: Candidate StatetementSequences
     :type statement_sequences: List[PairSequences]
+    :param f_size: Maximum number of lines covered by a statement with a
+        given mark, defaults to Cluster.getMaxCoveredLines
+    :type f_size: Function[Mark -> int], optional
+    """
+    return findHugeSequencesInTree(buildSuffixTree(statement_sequences), f_size)
+
+
+def buildSuffixTree(statement_sequences, progress=None):
+    """Build the suffix tree of the marks of statement sequences
+
+    :param statement_sequences: Candidate StatetementSequences
+    :type statement_sequences: List[StatementSequence]
+    :param progress: Called with the number of added statements and the
+        number of statements, defaults to None
+    :type progress: Function[int, int], optional
+    :rtype: {SuffixTree}
     """
-    # Function[Cluster -> int]
-    f_size = lambda x: x.getMaxCoveredLines()
-    # Function[List[AbstractSyntaxtree] -> int]
-    f_elem = lambda x: StatementSequence(x).getCoveredLineNumbersCount()
     # Key to use in SuffixTree, Function[AbstractSyntaxTree -> Cluster]
     fcode = lambda x: x.getMark()
 
+    added_statements_count = 0
+    statement_count = sum([len(sequence) for sequence in statement_sequences])
     suffix_tree_instance = suffix_tree.SuffixTree(fcode)
     for sequence in statement_sequences:
         suffix_tree_instance.add(sequence)
+        added_statements_count += len(sequence)
+        if progress is not None:
+            progress(added_statements_count, statement_count)
+    return suffix_tree_instance
+
+
+def findHugeSequencesInTree(suffix_tree_instance, f_size=None):
+    """Same as findHugeSequences, using the suffix tree built by buildSuffixTree
+
+    :param suffix_tree_instance: Suffix tree of the candidate StatementSequences
+    :type suffix_tree_instance: SuffixTree
+    :param f_size: Maximum number of lines covered by a statement with a
+        given mark, defaults to Cluster.getMaxCoveredLines
+    :type f_size: Function[Mark -> int], optional
+    """
+    if f_size is None:
+        # Function[Cluster -> int]
+        f_size = lambda x: x.getMaxCoveredLines()
+    # Function[List[AbstractSyntaxtree] -> int]
+    f_elem = lambda x: StatementSequence(x).getCoveredLineNumbersCount()
 
     tmp = suffix_tree_instance.getBestMaxSubstrings(arguments.size_threshold, f_size, f_elem)
     return [PairSequences([StatementSequence(s1), StatementSequence(s2)]) for (s1, s2) in tmp]
 
 
-def all_pairsubsequences_size_n_threshold(n, pair_sequences):
-    lr = []
-    for first in range(0, pair_sequences.getLength() - n + 1):
-        new_pair_sequences = pair_sequences.subSequence(first, n)
-        size = new_pair_sequences.getMaxCoveredLineNumbersCount()
-        if size >= arguments.size_threshold:
-            lr.append((new_pair_sequences, first))
-    return lr
+def longest_refined_subsequence(pair_sequences):
+    """Find the longest subsequence of a candidate whose distance is below the threshold
 
+    The subsequence must also cover at least `arguments.size_threshold` lines.
+    Among the longest ones, the first one is returned, as when every
+    subsequence is tried from the longest ones. The distance and the covered
+    lines of a subsequence can only grow when it is extended, so a window is
+    slid over the candidate, keeping for every last statement the longest
+    subsequence below `arguments.distance_threshold`: the cost is linear in
+    the length of the candidate.
 
-def refineDuplicates(pairs_sequences):
+    The distance of the window is the size of its distinct substituted pairs,
+    as in anti_unification.substitutions_size, updated when statements enter
+    and leave the window. Sizes are multiples of free_variable_cost, so the
+    sums are exact.
+
+    :param pair_sequences: Candidate clone
+    :type pair_sequences: PairSequences
+    :returns: First statement and length of the subsequence, None if no
+        subsequence is close enough
+    :rtype: {Union[Tuple[int, int], None]}
+    """
+    substitutions = pair_sequences.getSubstitutions()
+    index = {}  # Fingerprints -> List[[tree 1, tree 2, size, occurrences in the window]]
+    covered_lines = [{}, {}]  # Line number -> statements of the window covering it
+
+    def update(i, step):
+        """Add (step 1) or remove (step -1) statement i, return the change of the distance"""
+        for (sequence, lines) in zip(pair_sequences, covered_lines):
+            for line in sequence[i].getCoveredLineNumbers():
+                lines[line] = lines.get(line, 0) + step
+                if not lines[line]:
+                    del lines[line]
+        change = 0
+        for (node1, node2) in substitutions[i]:
+            same_key_pairs = index.setdefault((node1.getFingerprint(), node2.getFingerprint()), [])
+            for pair in same_key_pairs:
+                if pair[0] == node1 and pair[1] == node2:
+                    break
+            else:
+                pair = [node1, node2, sum(pairs_sizes([(node1, node2)])), 0]
+                same_key_pairs.append(pair)
+            pair[3] += step
+            if pair[3] == 0:
+                same_key_pairs.remove(pair)
+                change -= pair[2]
+            elif pair[3] == 1 and step > 0:
+                change += pair[2]
+        return change
+
+    best = None
+    first = 0
+    distance = 0
+    for end in range(pair_sequences.getLength()):
+        distance += update(end, 1)
+        while first <= end and distance >= arguments.distance_threshold:
+            distance += update(first, -1)
+            first += 1
+        length = end + 1 - first
+        if length and (best is None or length > best[1]) and \
+                min([len(lines) for lines in covered_lines]) >= arguments.size_threshold:
+            best = (first, length)
+    return best
+
+
+def refineDuplicates(pairs_sequences, progress=None):
+    """Return the subsequences of candidates whose distance is below the threshold
+
+    The longest subsequence of a candidate is kept (see
+    longest_refined_subsequence), and the parts of the candidate before and
+    after it are refined again.
+
+    :param pairs_sequences: Candidate clones, consumed
+    :type pairs_sequences: List[PairSequences]
+    :param progress: Called with the number of refined candidates and the
+        number of candidates, which grows when the remaining parts of a
+        candidate are refined, defaults to None
+    :type progress: Function[int, int], optional
+    :returns: Clones
+    :rtype: {List[PairSequences]}
+    """
     r = []
-    flag = False
+    refined_count = 0
     while pairs_sequences:
         pair_sequences = pairs_sequences.pop()
-        n = pair_sequences.getLength() + 1
-        while 1:
-            n -= 1
-            if n == 0:
-                break
-            new_pairs_sequences = all_pairsubsequences_size_n_threshold(n, pair_sequences)
-            for (candidate_sequence, first) in new_pairs_sequences:
-                distance = candidate_sequence.calcDistance()
-                if (distance < arguments.distance_threshold):
-                    r.append(candidate_sequence)
-                    if first > 0:
-                        pairs_sequences.append(
-                            pair_sequences.subSequence(0, first - 1))
-                    if first + n < pair_sequences.getLength():
-                        pairs_sequences.append(pair_sequences.subSequence(
-                            first + n, pair_sequences.getLength() - first - n))
-                    n += 1
-                    flag = True
-                    break
-            if flag:
-                flag = False
-                break
+        refined = longest_refined_subsequence(pair_sequences)
+        if refined is not None:
+            (first, n) = refined
+            r.append(pair_sequences.subSequence(first, n))
+            if first > 0:
+                pairs_sequences.append(
+                    pair_sequences.subSequence(0, first - 1))
+            if first + n < pair_sequences.getLength():
+                pairs_sequences.append(pair_sequences.subSequence(
+                    first + n, pair_sequences.getLength() - first - n))
+        refined_count += 1
+        if progress is not None:
+            progress(refined_count, refined_count + len(pairs_sequences))
     return r
 
 
-def remove_dominated_clones(clones):
-    """[summary]
+def remove_dominated_clones(clones, progress=None):
+    """Remove clones nested in other clones
+
+    A clone is dominated if a statement containing its first side and a
+    statement containing its second side are on the two sides of another
+    clone.
 
-    [description]
+    Statements are indexed by id, so looking for the clones containing an
+    ancestor does not compare trees, and every side of a clone is stored as
+    a set of statement ids, so checking the other side is a set lookup per
+    ancestor.
 
-    :param clones: [description]
+    :param clones: Clones
     :type clones: List[PairSequence]
-    :returns: [description]
+    :param progress: Called with the number of checked clones and the number
+        of clones, defaults to None
+    :type progress: Function[int, int], optional
+    :returns: Clones which are not dominated
     :rtype: {List[PairSequence]}
     """
     ret_clones = []
     # def f_cmp(a, b):
     #     return a.getLevel().__cmp__(b.getLevel())
     # clones.sort(f_cmp)
-    statement_to_clone = {}
-    for clone in clones:
-        for sequence in clone:
-            for statement in sequence:
-                if statement not in statement_to_clone:
-                    statement_to_clone[statement] = []
-                statement_to_clone[statement].append(clone)
-
-    for clone in clones:
-        ancestors_2 = clone[1].getAncestors()
+    sides = []  # Ids of the statements of both sides of every clone
+    statement_to_clone = {}  # Statement id -> Indexes of the clones containing it
+    for (index, clone) in enumerate(clones):
+        sides.append((frozenset([id(s) for s in clone[0]]),
+                      frozenset([id(s) for s in clone[1]])))
+        for statement_id in sides[-1][0] | sides[-1][1]:
+            statement_to_clone.setdefault(statement_id, []).append(index)
+
+    for (checked_count, clone) in enumerate(clones, 1):
+        ancestors_2 = [id(s2) for s2 in clone[1].getAncestors()]
         flag = True
         for s1 in clone[0].getAncestors():
-            if s1 in statement_to_clone:
-                for clone2 in statement_to_clone[s1]:
-                    if s1 in clone2[0]:
-                        seq = clone2[1]
-                    else:
-                        assert(s1 in clone2[1])
-                        seq = clone2[0]
-                    for s2 in seq:
-                        if s2 in ancestors_2:
-                            flag = False
-                            break
-                    if not flag:
-                        break
+            for index in statement_to_clone.get(id(s1), ()):
+                (side_1, side_2) = sides[index]
+                seq = side_2 if id(s1) in side_1 else side_1
+                if not seq.isdisjoint(ancestors_2):
+                    flag = False
+                    break
             if not flag:
                 break
         if flag:
             ret_clones.append(clone)
+        if progress is not None:
+            progress(checked_count, len(clones))
     return ret_clones
 
 
+def build_clone_classes(clones):
+    """Merge clones sharing a fragment into clone classes
+
+    A fragment is identified by its first statement and its length. Clones
+    are merged with a union-find over fragment ids, so a fragment duplicated
+    n times gives one class of n fragments instead of up to n * (n - 1) / 2
+    clones. The n - 1 clones which merged the fragments are kept as the pairs
+    of the class, so their distances and substitutions are reused by the
+    reports. As clones are transitively merged, two fragments of a class may
+    be farther than `arguments.distance_threshold` from each other.
+
+    :param clones: Clones
+    :type clones: List[PairSequences]
+    :returns: Clone classes, in the order of their first clone, with their
+        fragments sorted by location
+    :rtype: {List[CloneClass]}
+    """
+    fragment_ids = {}  # (First statement id, length) -> Fragment id
+    fragments = []
+    parents = []
+
+    def get_fragment_id(sequence):
+        key = (id(sequence[0]), sequence.getLength())
+        if key not in fragment_ids:
+            fragment_ids[key] = len(fragments)
+            fragments.append(sequence)
+            parents.append(len(parents))
+        return fragment_ids[key]
+
+    def find(i):
+        while parents[i] != i:
+            parents[i] = parents[parents[i]]
+            i = parents[i]
+        return i
+
+    links = []  # Clones which merged two classes, with the id of their first fragment
+    for clone in clones:
+        (fragment_1, fragment_2) = [get_fragment_id(sequence) for sequence in clone]
+        (root_1, root_2) = (find(fragment_1), find(fragment_2))
+        if root_1 != root_2:
+            parents[max(root_1, root_2)] = min(root_1, root_2)
+            links.append((fragment_1, clone))
+
+    # Roots are the first fragments of their class, so classes are in order
+    classes = {}
+    for i in range(len(fragments)):
+        classes.setdefault(find(i), []).append(fragments[i])
+    pairs = {}
+    for (fragment_1, clone) in links:
+        pairs.setdefault(find(fragment_1), []).append(clone)
+    # The fragments of a class are sorted by location, pairs find them by id
+    return [CloneClass(sorted(classes[root], key=lambda s: s.getLocation()), pairs[root])
+            for root in sorted(classes)]
+
+
 def print_statistics(sequences_lengths, statement_count):
     n_sequences = len(sequences_lengths)
     avg_seq_length = sum(sequences_lengths) / n_sequences
@@ -387,13 +875,15 @@ def findDuplicateCode(source_files, report):
         return []
 
     print_statistics(sequences_lengths, statement_count)
+    report.setCounter('sequences', len(sequences_lengths))
+    report.setCounter('statements', statement_count)
 
     ##
     # Prepare statements
     #  Compute hash value for every statement
     ##
 
-    if not arguments.force:
+    if not arguments.force and not arguments.window_long_sequences:
         statement_sequences = filterOutLongSequences(
             statement_sequences, MAX_SEQUENCE_LENGTH)
 
@@ -401,20 +891,52 @@ def findDuplicateCode(source_files, report):
     #  completed. Could this be done earlier ? (Right after parsing files)
 
     logging.info('Calculating size for each statement...')
-    for sequence in statement_sequences:
+    report.startTimer('Calculating size of statements')
+    for (sequence_i, sequence) in enumerate(statement_sequences, 1):
         for statement in sequence:
             statement.storeSize()
-
-    # First step of clustering:
-    #  Use hash to cluster Statements
-    logging.info('Building statement hash...')
-    report.startTimer('Building statement hash')
-    hash_to_statement = build_hash_to_statement(
-        statement_sequences,
-        dcup_hash=arguments.clusterize_using_hash)
+        report.setProgress(sequence_i, len(statement_sequences))
     report.stopTimer()
 
-    logging.info('Number of different hash values: {}'.format(len(hash_to_statement)))
+    # When statements are marked with their hash, integer labels are used as
+    #  marks instead of Cluster objects (these are needed to report unifiers)
+    use_hash_labels = (arguments.clusterize_using_dcup or arguments.clusterize_using_hash) and \
+        not arguments.report_unifiers and not arguments.max_bucket_size
+    max_covered_lines = None
+
+    use_lsh = arguments.clustering_engine == 'lsh' and not (
+        arguments.clusterize_using_dcup or arguments.clusterize_using_hash)
+    if use_lsh:
+        # Clusters are built inside groups of statements with similar
+        #  characteristic vectors instead of groups of statements with the same hash
+        logging.info('Building characteristic vectors...')
+        report.startTimer('Building characteristic vectors')
+        hash_to_statement = characteristic_vectors.build_lsh_to_statement(
+            statement_sequences, arguments.lsh_bits)
+        report.stopTimer()
+        report.setCounter('lsh_buckets', len(hash_to_statement))
+    else:
+        # First step of clustering:
+        #  Use hash to cluster Statements
+        logging.info('Building statement hash...')
+        report.startTimer('Building statement hash')
+        if use_hash_labels:
+            max_covered_lines = build_hash_labels(
+                statement_sequences,
+                dcup_hash=arguments.clusterize_using_hash)
+            hash_count = len(max_covered_lines)
+        else:
+            # Statements are hashed using the dcup hash of `hashing_depth` only with
+            #  --fast, or when large buckets are split with --max-bucket-size
+            hash_to_statement = build_hash_to_statement(
+                statement_sequences,
+                dcup_hash=arguments.clusterize_using_hash or bool(arguments.max_bucket_size),
+                max_bucket_size=arguments.max_bucket_size)
+            hash_count = len(hash_to_statement)
+        report.stopTimer()
+
+        logging.info('Number of different hash values: {}'.format(hash_count))
+        report.setCounter('hash_buckets', hash_count)
 
     ##
     # Group statements in clusters of similar statements
@@ -424,9 +946,13 @@ def findDuplicateCode(source_files, report):
     # Second step of clustering:
     #  Find patterns which are recurring sequences of Clusters
 
-    if arguments.clusterize_using_dcup or arguments.clusterize_using_hash:
+    if use_hash_labels:
+        # Statements were marked with the label of their hash
+        pass
+    elif arguments.clusterize_using_dcup or arguments.clusterize_using_hash:
         # As statements can have the same hash, use the hash to make clusters
         logging.info('Marking each statement with its hash value')
+        report.startTimer('Marking similar statements')
         # mark_using_hash
         # For each hash make a Cluster
         # Populate Cluster objects and setMark
@@ -435,17 +961,27 @@ def findDuplicateCode(source_files, report):
             for statement in hash_to_statement[h]:
                 cluster.addWithoutUnification(statement)
                 statement.setMark(cluster)
+        report.stopTimer()
+    elif arguments.clustering_jobs > 1:
+        logging.info('Building patterns and marking statements with {} processes...'.format(
+            arguments.clustering_jobs))
+        report.startTimer('Building patterns and marking similar statements')
+        clusterize_in_parallel(hash_to_statement, arguments.clustering_jobs, report.setProgress)
+        report.stopTimer()
+        logging.info('{} patterns were discovered'.format(Cluster.count))
+        report.setCounter('patterns', Cluster.count)
     else:
         logging.info('Building patterns...')
         report.startTimer('Building patterns')
-        clusters_map = build_unifiers(hash_to_statement)
+        clusters_map = build_unifiers(hash_to_statement, report.setProgress)
         # Populate Cluster objects
         report.stopTimer()
         logging.info('{} patterns were discovered'.format(Cluster.count))
+        report.setCounter('patterns', Cluster.count)
 
         logging.info('Choosing pattern for each statement...')
         report.startTimer('Marking similar statements')
-        clusterize(hash_to_statement, clusters_map)
+        clusterize(hash_to_statement, clusters_map, report.setProgress)
         report.stopTimer()
 
     if arguments.report_unifiers:
@@ -474,11 +1010,34 @@ def findDuplicateCode(source_files, report):
         statement_sequences = filterOutLongEquallyLabeledSequences(
             statement_sequences)
 
-    report.startTimer('Finding similar sequences of statements')
+    if max_covered_lines is not None:
+        f_size = max_covered_lines.__getitem__
+    else:
+        f_size = lambda x: x.getMaxCoveredLines()
+
+    report.startTimer('Building suffix tree')
+    # `statement_sequences` are kept to count the lines of the input
+    candidate_sequences = filterOutSingletonStatements(statement_sequences, f_size)
+    window_long_sequences = arguments.window_long_sequences and not arguments.force
+    if window_long_sequences:
+        candidate_windows = splitLongSequences(
+            candidate_sequences, MAX_SEQUENCE_LENGTH, WINDOW_OVERLAP, WINDOW_LENGTH)
+    else:
+        candidate_windows = candidate_sequences
+    # The suffix tree is built in its own phase to be seen by the phase listeners
+    suffix_tree_instance = buildSuffixTree(candidate_windows, report.setProgress)
+    report.stopTimer()
+
     # Get clone candidates
-    duplicate_candidates = findHugeSequences(statement_sequences)
+    report.startTimer('Finding similar sequences of statements')
+    duplicate_candidates = findHugeSequencesInTree(suffix_tree_instance, f_size)
+    del suffix_tree_instance
+    if window_long_sequences:
+        duplicate_candidates = stitchWindowedCandidates(
+            duplicate_candidates, candidate_sequences, MAX_SEQUENCE_LENGTH)
     report.stopTimer()
     logging.info('{} sequences were found'.format(len(duplicate_candidates)))
+    report.setCounter('candidates', len(duplicate_candidates))
 
     ##
     # Filtering clone candidates
@@ -487,17 +1046,27 @@ def findDuplicateCode(source_files, report):
     logging.info('Refining candidates...')
     if arguments.distance_threshold != -1:
         report.startTimer('Refining candidates')
-        clones = refineDuplicates(duplicate_candidates)
+        clones = refineDuplicates(duplicate_candidates, report.setProgress)
         report.stopTimer()
     else:
         clones = duplicate_candidates
     logging.info('{} clones were found'.format(len(clones)))
+    report.setCounter('clones', len(clones))
 
     if arguments.distance_threshold != -1:
         logging.info('Removing dominated clones...')
         old_clone_count = len(clones)
-        clones = remove_dominated_clones(clones)
+        report.startTimer('Removing dominated clones')
+        clones = remove_dominated_clones(clones, report.setProgress)
+        report.stopTimer()
         logging.info('{} clones were removed'.format(len(clones) - old_clone_count))
+        report.setCounter('dominated_clones', old_clone_count - len(clones))
+
+    report.startTimer('Building clone classes')
+    clones = build_clone_classes(clones)
+    report.stopTimer()
+    logging.info('{} clone classes were built'.format(len(clones)))
+    report.setCounter('clone_classes', len(clones))
 
     ##
     # Filling report
@@ -509,7 +1078,6 @@ def findDuplicateCode(source_files, report):
     # get covered source lines for all detected clones (set of all)
     covered_source_lines = set()
     for clone in clones:
-        # clone is a pair sequence thus it has 2 elements
         for sequence in clone:
             covered_source_lines |= sequence.getLineNumberHashables()
 
@@ -520,5 +1088,77 @@ def findDuplicateCode(source_files, report):
 
     report.all_source_lines_count = len(source_lines)
     report.covered_source_lines_count = len(covered_source_lines)
+    report.setCounter('source_lines', report.all_source_lines_count)
+    report.setCounter('covered_source_lines', report.covered_source_lines_count)
 
     return clones
+
+
+if __name__ == '__main__':
+    # Run with `python -m clonedigger.clone_detection_algorithm`
+    from .abstract_syntax_tree import SourceFile
+
+    class GeneratedSourceFile(SourceFile):
+        """Source file of one statement per line, named after `names`"""
+        def __init__(self, names):
+            self._file_name = 'generated.py'
+            self._source_lines = names
+            module = AbstractSyntaxTree('Module', [], self)
+            statements = AbstractSyntaxTree('Stmt', [], self)
+            module.addChild(statements)
+            for (line, name) in enumerate(names):
+                statement = AbstractSyntaxTree(name, [line], self)
+                statement.addChild(AbstractSyntaxTree('x', [line], self))
+                statement.markAsStatement()
+                statements.addChild(statement)
+            module.propagateCoveredLineNumbers()
+            module.propagateHeight()
+            self._tree = module
+
+    def test_deep_suffix_tree():
+        # The tree of a long repeated string is deeper than the recursion limit
+        t = suffix_tree.SuffixTree()
+        t.add([0, 1, 2] * 400)
+        maxs = t.getBestMaxSubstrings(1190, lambda code: 1, len)
+        assert sorted([(len(s1), len(s2)) for (s1, s2) in maxs]) == [(1191, 1191), (1194, 1194), (1197, 1197)]
+
+    def test_window_long_sequences():
+        # A block of 40 statements repeated in a sequence of 1200 statements,
+        #  its first copy is in two windows
+        names = ['Statement%d' % i for i in range(1200)]
+        names[480:520] = names[900:940] = ['Block%d' % i for i in range(40)]
+        arguments.size_threshold = 5
+        arguments.distance_threshold = 5
+        arguments.clustering_threshold = 10
+        sequences = GeneratedSourceFile(names).getTree().getAllStatementSequences()
+        for statement in sequences[0]:
+            statement.setMark(statement.getName())
+        windows = splitLongSequences(sequences, MAX_SEQUENCE_LENGTH, WINDOW_OVERLAP, WINDOW_LENGTH)
+        assert len(windows) == 16
+        candidates = stitchWindowedCandidates(
+            findHugeSequencesInTree(buildSuffixTree(windows), lambda mark: 1), sequences,
+            MAX_SEQUENCE_LENGTH)
+        clones = refineDuplicates(candidates)
+        assert [sorted([(min(s.getCoveredLineNumbers()), max(s.getCoveredLineNumbers())) for s in clone])
+                for clone in clones] == [[(480, 519), (900, 939)]]
+
+    def test_window_long_clone():
+        # A block of 250 statements, longer than a window, is one clone
+        names = ['Statement%d' % i for i in range(1200)]
+        names[300:550] = names[800:1050] = ['Block%d' % i for i in range(250)]
+        arguments.size_threshold = 5
+        arguments.distance_threshold = 5
+        sequences = GeneratedSourceFile(names).getTree().getAllStatementSequences()
+        for statement in sequences[0]:
+            statement.setMark(statement.getName())
+        windows = splitLongSequences(sequences, MAX_SEQUENCE_LENGTH, WINDOW_OVERLAP, WINDOW_LENGTH)
+        candidates = stitchWindowedCandidates(
+            findHugeSequencesInTree(buildSuffixTree(windows), lambda mark: 1), sequences,
+            MAX_SEQUENCE_LENGTH)
+        clones = refineDuplicates(candidates)
+        assert [sorted([(min(s.getCoveredLineNumbers()), max(s.getCoveredLineNumbers())) for s in clone])
+                for clone in clones] == [[(300, 549), (800, 1049)]]
+
+    for s in dir():
+        if s.find('test') == 0:
+            eval(s + '()')
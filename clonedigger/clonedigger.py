@@ -42,9 +42,11 @@ import logging
 from optparse import OptionParser
 
 from . import ast_suppliers
+from . import characteristic_vectors
 from . import clone_detection_algorithm
 from . import arguments
 from . import reports
+from . import phases
 
 
 def parse_file(file_name, func_prefixes, report, lang, supplier):
@@ -110,12 +112,34 @@ All arguments are optional. Supported options are:
     cmdline.add_option('--clustering-threshold',
                        type='int', dest='clustering_threshold', default=10,
                        help='read the paper for semantics')
+    cmdline.add_option('--clustering-jobs',
+                       type='int', dest='clustering_jobs', default=1,
+                       help='number of processes used to build the patterns of '
+                       'similar statements (1 by default)')
+    cmdline.add_option('--clustering-engine', dest='clustering_engine',
+                       default='greedy', type='choice', choices=['greedy', 'lsh'],
+                       help='how statements are grouped before building patterns: '
+                       '"greedy" (default) uses the hash of statements, "lsh" uses '
+                       'locality-sensitive hashing of node type counts, which '
+                       'scales to larger inputs (requires NumPy)')
+    cmdline.add_option('--lsh-bits',
+                       type='int', dest='lsh_bits', default=16,
+                       help='number of bits of the signatures of the "lsh" engine, '
+                       'from 1 to %d (16 by default). Larger value leads to smaller '
+                       'groups' % characteristic_vectors.MAX_BITS)
     cmdline.add_option('--hashing-depth',
                        type='int', dest='hashing_depth', default=1,
                        help='default value if 1, read the paper for semantics. '
                        'Computation can be speeded up by increasing this value '
                        '(but some clones can be missed)')
 
+    cmdline.add_option('--max-bucket-size',
+                       type='int', dest='max_bucket_size',
+                       help='statements are grouped by their hash of depth '
+                       '--hashing-depth, and groups larger than this value are '
+                       'split using deeper hashes. Bounds the clustering cost '
+                       'while keeping the recall of shallow hashing for small groups')
+
     # Deal with input
     cmdline.add_option('--no-recursion', dest='no_recursion',
                        action='store_true',
@@ -141,6 +165,49 @@ All arguments are optional. Supported options are:
                        action='store_true', dest='cpd_output',
                        help='output as PMD''s CPD''s XML format. If output file '
                        'not defined, output.xml is generated')
+    cmdline.add_option('--json-output',
+                       action='store_true', dest='json_output',
+                       help='output as JSON Lines, one object per clone and a '
+                       'summary object. If output file not defined, '
+                       'output.jsonl is generated')
+    cmdline.add_option('--json-substitutions',
+                       action='store_true', dest='json_substitutions',
+                       help='write the substitutions of the anti-unifiers of '
+                       'the clones in the JSON Lines output')
+    cmdline.add_option('--sqlite-output',
+                       action='store_true', dest='sqlite_output',
+                       help='store the clones and the run information in a '
+                       'SQLite database. If output file not defined, '
+                       'output.sqlite is used')
+    cmdline.add_option('--clones-per-page',
+                       type='int', dest='clones_per_page',
+                       help='write the HTML report as a summary page linking to '
+                       'pages of this many clones, written in the directory '
+                       '<output without extension>_files')
+    cmdline.add_option('--report-jobs',
+                       type='int', dest='report_jobs', default=1,
+                       help='number of processes used to render the clones of '
+                       'the HTML report (1 by default)')
+    cmdline.add_option('--metrics', dest='metrics',
+                       help='write the wall time, CPU time, memory at its start '
+                       'and end and peak memory of every phase, and the number of '
+                       'statements, patterns, candidates and clones, to this JSON file')
+    cmdline.add_option('--profile', dest='profile',
+                       help='profile every phase with cProfile, and write the '
+                       'statistics (.prof) and the collapsed stacks (.folded) '
+                       'of each phase in this directory')
+    cmdline.add_option('--trace-memory', dest='trace_memory',
+                       help='write the resident set size, and the number and '
+                       'estimated size of the syntax tree nodes, clusters, suffix '
+                       'tree nodes and candidates, with their change, after every '
+                       'phase to this file (slow). Allocation sites are not traced')
+    cmdline.add_option('--progress',
+                       action='store_true', dest='progress',
+                       help='show the progress of every phase, with its rate '
+                       'and estimated remaining time, on the standard error')
+    cmdline.add_option('--progress-output', dest='progress_output',
+                       help='write the progress of every phase to this file, '
+                       'as JSON Lines')
     cmdline.add_option('--report-unifiers',
                        action='store_true', dest='report_unifiers',
                        help='')
@@ -148,6 +215,12 @@ All arguments are optional. Supported options are:
                        action='store_true', dest='force',
                        help='By default clonedigger ignore statements with more '
                        'than 1000 elements.\nThis option prevent this behaviour.')
+    cmdline.add_option('--window-long-sequences',
+                       action='store_true', dest='window_long_sequences',
+                       help='split sequences of more than 1000 statements into '
+                       'overlapping windows of 100 statements instead of '
+                       'ignoring them. Clones spanning several windows are '
+                       'joined back')
     cmdline.add_option('-v', '--verbose',
                        action='store_true',
                        help='Print informations')
@@ -159,8 +232,17 @@ All arguments are optional. Supported options are:
     cmdline.add_option('--force-diff',
                        action='store_true', dest='use_diff',
                        help='force highlighting of differences based on the diff algorithm')
+    cmdline.add_option('--diff-highlighting', dest='diff_highlighting',
+                       type='choice', choices=['lines', 'chars'], default='lines',
+                       help='how differences are found when highlighted with '
+                       'diff: "lines" aligns lines first then compares the '
+                       'characters of changed lines, "chars" compares whole '
+                       'fragments character by character ("lines" by default)')
 
-    return cmdline.parse_args()
+    (options, args) = cmdline.parse_args()
+    if not 0 < options.lsh_bits <= characteristic_vectors.MAX_BITS:
+        cmdline.error('--lsh-bits must be between 1 and %d' % characteristic_vectors.MAX_BITS)
+    return (options, args)
 
 
 def main():
@@ -180,6 +262,10 @@ def main():
     if options.language != 'python':
         options.use_diff = True
 
+    if options.clustering_engine == 'lsh' and characteristic_vectors.numpy is None:
+        logging.error('The lsh clustering engine requires NumPy')
+        sys.exit(1)
+
     supplier = ast_suppliers.abstract_syntax_tree_suppliers[options.language]
     if not options.size_threshold:
         options.size_threshold = supplier.size_threshold
@@ -191,21 +277,53 @@ def main():
         if options.output is None:
             options.output = 'output.xml'
         report = reports.CPDXMLReport()
+    elif options.json_output:
+        if options.output is None:
+            options.output = 'output.jsonl'
+        report = reports.JSONLinesReport(options.output, options.json_substitutions)
+    elif options.sqlite_output:
+        if options.output is None:
+            options.output = 'output.sqlite'
+        report = reports.SQLiteReport(options.output)
     else:
         if options.output is None:
             options.output = 'output.html'
-        report = reports.HTMLReport()
+        if options.clones_per_page:
+            report = reports.PaginatedHTMLReport(options.clones_per_page)
+        else:
+            report = reports.HTMLReport()
 
     output_file_name = options.output
 
+    # Listeners added first see the overhead of the next ones, the metrics
+    #  are added last so they do not include the tracing and the profiling
+    if options.trace_memory:
+        report.addPhaseListener(phases.MemoryTracer(options.trace_memory))
+    if options.profile:
+        report.addPhaseListener(phases.Profiler(options.profile))
+    if options.progress:
+        report.addPhaseListener(phases.TerminalProgress())
+    if options.progress_output:
+        report.addPhaseListener(phases.ProgressStream(options.progress_output))
+    if options.metrics:
+        metrics = phases.MetricsRecorder()
+        report.addPhaseListener(metrics)
+
     # Fill `arguments` from `options` (the variables are hard coded, they
     #  were retrieved by looking at what variable from `options` were used)
     setattr(arguments, 'clustering_threshold', options.clustering_threshold)
+    setattr(arguments, 'clustering_jobs', options.clustering_jobs)
+    setattr(arguments, 'clustering_engine', options.clustering_engine)
+    setattr(arguments, 'lsh_bits', options.lsh_bits)
     setattr(arguments, 'clusterize_using_dcup', options.clusterize_using_dcup)
     setattr(arguments, 'clusterize_using_hash', options.clusterize_using_hash)
     setattr(arguments, 'hashing_depth', options.hashing_depth)
+    setattr(arguments, 'max_bucket_size', options.max_bucket_size)
     setattr(arguments, 'force', options.force)
+    setattr(arguments, 'window_long_sequences', options.window_long_sequences)
     setattr(arguments, 'use_diff', options.use_diff)
+    setattr(arguments, 'diff_highlighting', options.diff_highlighting)
+    setattr(arguments, 'report_jobs', options.report_jobs)
     setattr(arguments, 'print_time', options.print_time)
     setattr(arguments, 'report_unifiers', options.report_unifiers)
     setattr(arguments, 'eclipse_output', options.eclipse_output)
@@ -249,43 +367,54 @@ def main():
 
     source_file_names = extended_source_file_names
 
-    ##
-    # Parse files
-    ##
+    # The files created by the report are removed if anything fails, the
+    #  JSON Lines report writes the clones when they are added, before writeReport
+    try:
+        ##
+        # Parse files
+        ##
 
-    source_files = []  # Contains parsed files
+        source_files = []  # Contains parsed files
 
-    report.startTimer('Construction of AST')
+        report.startTimer('Construction of AST')
 
-    for file_name in source_file_names:
-        source_file = parse_file(file_name, func_prefixes, report, options.language, supplier)
-        if source_file:
-            source_files.append(source_file)
+        for (file_i, file_name) in enumerate(source_file_names, 1):
+            source_file = parse_file(file_name, func_prefixes, report, options.language, supplier)
+            if source_file:
+                source_files.append(source_file)
+            report.setProgress(file_i, len(source_file_names))
 
-    report.stopTimer()
+        report.stopTimer()
+        report.setCounter('files', len(source_files))
+        report.setCounter('unparsed_files', len(source_file_names) - len(source_files))
 
-    ##
-    # Detect Clones
-    ##
+        ##
+        # Detect Clones
+        ##
 
-    duplicates = clone_detection_algorithm.findDuplicateCode(source_files, report)
+        duplicates = clone_detection_algorithm.findDuplicateCode(source_files, report)
 
-    ##
-    # Create report
-    ##
+        ##
+        # Create report
+        ##
 
-    for duplicate in duplicates:
-        report.addClone(duplicate)
-    report.sortByCloneSize()
+        # Not a timer, the report would time its own writing
+        report.startPhase('Writing report')
+        for duplicate in duplicates:
+            report.addClone(duplicate)
+        report.sortByCloneSize()
 
-    try:
         report.writeReport(output_file_name)
+        report.stopPhase('Writing report')
     except:
-        logging.error("catched error, removing output file")
-        if os.path.exists(output_file_name):
-            os.remove(output_file_name)
+        # The SQLite report removes nothing, the database holds previous runs
+        #  and the current one is not committed
+        report.removeOutput()
         raise
 
+    if options.metrics:
+        metrics.writeMetrics(options.metrics, reports.get_parameters())
+
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,539 @@
+#    This file is part of Clone Digger.
+#
+#    Clone Digger is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Clone Digger is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with Clone Digger.  If not, see <http://www.gnu.org/licenses/>.
+
+"""phases module
+
+Listeners of the phases of a run.
+
+A run is split in phases by Report.startTimer / Report.stopTimer (the phases
+shown in the timings of the reports) and by Report.startPhase /
+Report.stopPhase (the phases that are not, like writing the report). The
+listeners added with Report.addPhaseListener are notified when a phase starts
+and stops, of the counters set with Report.setCounter and of the progress of
+the phase given to Report.setProgress.
+"""
+
+import gc
+import os
+import re
+import sys
+import time
+import json
+import logging
+import cProfile
+import pstats
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+from .abstract_syntax_tree import AbstractSyntaxTree, StatementSequence, PairSequences, CloneClass
+from .anti_unification import Cluster
+from .suffix_tree import SuffixTree
+
+PROGRESS_INTERVAL = 1.0  #: Minimum number of seconds between two progress updates
+
+#: Structures counted by MemoryTracer, (label, class)
+COUNTED_STRUCTURES = [
+    ('syntax tree nodes', AbstractSyntaxTree),
+    ('clusters', Cluster),
+    ('suffix tree nodes', SuffixTree.SuffixTreeNode),
+    ('string positions', SuffixTree.StringPosition),
+    ('statement sequences', StatementSequence),
+    ('pairs of sequences (candidates and clones)', PairSequences),
+    ('clone classes', CloneClass)]
+
+
+def get_cpu_times():
+    """Return the CPU time used by this process and by its finished children
+
+    :returns: (Seconds used by this process, seconds used by its children)
+    :rtype: {Tuple[float, float]}
+    """
+    times = os.times()
+    return (times[0] + times[1], times[2] + times[3])
+
+
+def get_peak_rss():
+    """Return the peak resident set size of this process
+
+    :returns: Bytes, None if it can not be known on this platform
+    :rtype: {int}
+    """
+    if resource is None:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return peak_rss
+    # Kilobytes on Linux and BSD
+    return peak_rss * 1024
+
+
+def get_current_rss():
+    """Return the resident set size of this process
+
+    :returns: Bytes, None if it can not be known on this platform (it is
+        read from /proc/self/statm)
+    :rtype: {int}
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class PhaseListener(object):
+    """Base class of the objects notified of the phases of a run"""
+
+    def startPhase(self, name):
+        pass
+
+    def stopPhase(self, name):
+        pass
+
+    def setCounter(self, name, value):
+        pass
+
+    def setProgress(self, done, total):
+        pass
+
+
+class MetricsRecorder(PhaseListener):
+    """Record the resources used by every phase, and the counters
+
+    For every phase, the wall time, the CPU time of this process and of its
+    children (the --clustering-jobs and --report-jobs workers) and the memory
+    are recorded, with its start in seconds since the creation of the
+    recorder. The memory is the RSS at the start and at the end of the phase,
+    the peak RSS of the process at its end, and how much the phase raised
+    this peak, which is not 0 only for the phases that needed more memory
+    than all the previous ones. A counter is attached to the last started
+    phase, which is the phase computing it, and to the counters of the run.
+    """
+
+    def __init__(self):
+        self._phases = []
+        self._counters = {}
+        self._started_at = time.time()
+        self._start_cpu_times = get_cpu_times()
+
+    def startPhase(self, name):
+        self._phases.append({
+            'name': name,
+            'start_seconds': time.time() - self._started_at,
+            'cpu_times': get_cpu_times(),
+            'start_peak_rss': get_peak_rss(),
+            'start_rss_bytes': get_current_rss(),
+            'counters': {}})
+
+    def stopPhase(self, name):
+        phase = self._phases[-1]
+        (cpu_seconds, children_cpu_seconds) = get_cpu_times()
+        phase['wall_seconds'] = time.time() - self._started_at - phase['start_seconds']
+        phase['cpu_seconds'] = cpu_seconds - phase['cpu_times'][0]
+        phase['children_cpu_seconds'] = children_cpu_seconds - phase['cpu_times'][1]
+        phase['end_rss_bytes'] = get_current_rss()
+        phase['peak_rss_bytes'] = get_peak_rss()
+        if phase['peak_rss_bytes'] is None:
+            phase['peak_rss_increase_bytes'] = None
+        else:
+            phase['peak_rss_increase_bytes'] = phase['peak_rss_bytes'] - phase['start_peak_rss']
+        del phase['cpu_times']
+        del phase['start_peak_rss']
+
+    def setCounter(self, name, value):
+        self._counters[name] = value
+        if self._phases:
+            self._phases[-1]['counters'][name] = value
+
+    def getMetrics(self, parameters=None):
+        """Return the metrics recorded since the creation of the recorder
+
+        :param parameters: Parameters of the run, defaults to None
+        :type parameters: Dict[str -> object], optional
+        :returns: JSON serializable metrics
+        :rtype: {Dict[str -> object]}
+        """
+        (cpu_seconds, children_cpu_seconds) = get_cpu_times()
+        return {
+            'started_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self._started_at)),
+            'python_version': sys.version.split()[0],
+            'parameters': parameters or {},
+            'wall_seconds': time.time() - self._started_at,
+            'cpu_seconds': cpu_seconds - self._start_cpu_times[0],
+            'children_cpu_seconds': children_cpu_seconds - self._start_cpu_times[1],
+            'peak_rss_bytes': get_peak_rss(),
+            'counters': self._counters,
+            'phases': [phase for phase in self._phases if 'wall_seconds' in phase]}
+
+    def writeMetrics(self, file_name, parameters=None):
+        """Write the metrics in a JSON file
+
+        :param file_name: Name of the JSON file
+        :type file_name: str
+        :param parameters: Parameters of the run, defaults to None
+        :type parameters: Dict[str -> object], optional
+        """
+        logging.info('Writing metrics to {}'.format(file_name))
+        with open(file_name, 'w') as f:
+            json.dump(self.getMetrics(parameters), f, indent=2, sort_keys=True)
+            f.write('\n')
+
+
+def get_function_label(function):
+    """Return the name of a function of the profiling statistics
+
+    :param function: (File name, line number, function name)
+    :type function: Tuple[str, int, str]
+    :rtype: {str}
+    """
+    (file_name, line, name) = function
+    if file_name == '~':
+        # Built-in function
+        return name
+    return '{}:{}:{}'.format(os.path.basename(file_name), line, name)
+
+
+def collapse_stacks(stats):
+    """Build the collapsed stacks of profiling statistics
+
+    cProfile only records the calls between pairs of functions, so the stacks
+    are rebuilt from the functions which were not called by another one, and
+    the time of a function is shared between its callers in proportion to the
+    time spent in the calls of each caller. Recursive calls are not followed.
+
+    :param stats: Profiling statistics
+    :type stats: pstats.Stats
+    :returns: Stack (functions separated by ';') -> microseconds spent in its last function
+    :rtype: {Dict[str -> int]}
+    """
+    callees = {}
+    for (function, (_, _, _, _, callers)) in stats.stats.items():
+        for caller in callers:
+            callees.setdefault(caller, []).append(function)
+    stacks = {}
+    roots = [function for function in stats.stats if not stats.stats[function][4]]
+    # (function, part of its time spent in this stack, stack)
+    todo = [(function, 1.0, (function,)) for function in roots]
+    while todo:
+        (function, ratio, stack) = todo.pop()
+        (_, _, self_time, cumulative_time, _) = stats.stats[function]
+        key = ';'.join([get_function_label(f) for f in stack])
+        stacks[key] = stacks.get(key, 0) + self_time * ratio
+        for callee in callees.get(function, []):
+            if callee in stack:
+                continue
+            callee_time = stats.stats[callee][3]
+            call_time = stats.stats[callee][4][function][3]
+            if callee_time > 0 and call_time > 0:
+                todo.append((callee, ratio * call_time / callee_time, stack + (callee,)))
+    return dict([(key, int(round(seconds * 1e6))) for (key, seconds) in stacks.items()
+                 if seconds >= 5e-7])
+
+
+class Profiler(PhaseListener):
+    """Profile every phase with cProfile
+
+    For every phase, the statistics of cProfile are written in
+    `<directory>/<phase number>_<phase name>.prof` (to be read by pstats or
+    snakeviz), and the collapsed stacks in the `.folded` file of the same name
+    (to be read by flamegraph.pl or speedscope). Processes forked by the
+    phases are not profiled.
+    """
+
+    def __init__(self, directory):
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._directory = directory
+        self._phase_count = 0
+        self._profile = None
+
+    def getFileName(self, name, extension):
+        """Return the name of a file written for the current phase"""
+        slug = re.sub('[^a-z0-9]+', '_', name.lower()).strip('_')
+        return os.path.join(self._directory, '{:02d}_{}{}'.format(
+            self._phase_count, slug, extension))
+
+    def startPhase(self, name):
+        self._phase_count += 1
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+
+    def stopPhase(self, name):
+        self._profile.disable()
+        file_name = self.getFileName(name, '.prof')
+        logging.info('Writing profile of "{}" to {}'.format(name, file_name))
+        self._profile.dump_stats(file_name)
+        stats = pstats.Stats(self._profile)
+        with open(self.getFileName(name, '.folded'), 'w') as f:
+            for (stack, microseconds) in sorted(collapse_stacks(stats).items()):
+                f.write('{} {}\n'.format(stack, microseconds))
+        self._profile = None
+
+
+def format_size(size):
+    """Return a number of bytes in a readable unit
+
+    :type size: int
+    :rtype: {str}
+    """
+    for unit in ['B', 'KiB', 'MiB']:
+        if abs(size) < 1024:
+            return '{:.1f} {}'.format(size, unit)
+        size /= 1024.0
+    return '{:.1f} GiB'.format(size)
+
+
+def get_object_size(obj):
+    """Estimate the memory used by an object
+
+    The size of the object, of its attribute dict and of the lists, tuples,
+    dicts and sets it holds directly (like the children of a node), but not
+    of the objects they hold.
+
+    :returns: Bytes
+    :rtype: {int}
+    """
+    size = sys.getsizeof(obj)
+    attributes = getattr(obj, '__dict__', None)
+    if attributes is not None:
+        size += sys.getsizeof(attributes)
+        for value in attributes.values():
+            if isinstance(value, (list, tuple, dict, set, frozenset)):
+                size += sys.getsizeof(value)
+    return size
+
+
+def measure_structures():
+    """Count the live objects of the structures of COUNTED_STRUCTURES, and estimate their size
+
+    :returns: Label -> (number of objects, bytes, see get_object_size)
+    :rtype: {Dict[str -> Tuple[int, int]]}
+    """
+    counts = dict([(label, 0) for (label, _) in COUNTED_STRUCTURES])
+    sizes = dict([(label, 0) for (label, _) in COUNTED_STRUCTURES])
+    types = {}
+    for obj in gc.get_objects():
+        obj_type = type(obj)
+        if obj_type not in types:
+            types[obj_type] = None
+            for (label, cls) in COUNTED_STRUCTURES:
+                if issubclass(obj_type, cls):
+                    types[obj_type] = label
+                    break
+        label = types[obj_type]
+        if label is not None:
+            counts[label] += 1
+            sizes[label] += get_object_size(obj)
+    return dict([(label, (counts[label], sizes[label])) for label in counts])
+
+
+class MemoryTracer(PhaseListener):
+    """Describe the memory used by the run after every phase
+
+    After every phase, the RSS of the process (how much it changed during
+    the phase) and its peak are appended to the report file, with the number
+    of live objects of COUNTED_STRUCTURES and their estimated size (see
+    get_object_size), largest first, and how much they changed since the
+    previous phase.
+
+    Measuring the objects walks the whole heap, so the run is slower.
+    """
+
+    def __init__(self, file_name):
+        self._file_name = file_name
+        open(file_name, 'w').close()
+        self._start_rss = None
+        self._structures = measure_structures()
+
+    def startPhase(self, name):
+        self._start_rss = get_current_rss()
+
+    def stopPhase(self, name):
+        lines = ['== {} =='.format(name)]
+        rss = get_current_rss()
+        if rss is not None:
+            line = 'Resident set size: {}'.format(format_size(rss))
+            if self._start_rss is not None:
+                line += ' ({}{} during the phase)'.format(
+                    '+' if rss >= self._start_rss else '', format_size(rss - self._start_rss))
+            lines.append(line)
+        peak_rss = get_peak_rss()
+        if peak_rss is not None:
+            lines.append('Peak resident set size of the process: {}'.format(format_size(peak_rss)))
+        structures = measure_structures()
+        lines.append('Live objects, estimated size (change since the previous phase):')
+        for (label, _) in sorted(COUNTED_STRUCTURES, key=lambda s: -structures[s[0]][1]):
+            (count, size) = structures[label]
+            (previous_count, previous_size) = self._structures[label]
+            lines.append('  {}: {}, {} ({:+d}, {}{})'.format(
+                label, count, format_size(size), count - previous_count,
+                '+' if size >= previous_size else '', format_size(size - previous_size)))
+        with open(self._file_name, 'a') as f:
+            f.write('\n'.join(lines) + '\n\n')
+        self._structures = structures
+
+
+def format_duration(seconds):
+    """Return a number of seconds as h:mm:ss
+
+    :type seconds: float
+    :rtype: {str}
+    """
+    seconds = int(round(seconds))
+    return '{}:{:02d}:{:02d}'.format(seconds // 3600, seconds // 60 % 60, seconds % 60)
+
+
+class ProgressListener(PhaseListener):
+    """Base class of the listeners showing the progress of the phases
+
+    The rate is computed since the start of the phase, and the estimated
+    remaining time from the rate, when the number of items to process is
+    known. The progress is shown when a phase starts and stops, and at most
+    every `interval` seconds in between.
+
+    :param interval: Minimum number of seconds between two progress updates
+    :type interval: float
+    """
+
+    def __init__(self, interval=PROGRESS_INTERVAL):
+        self._interval = interval
+        self._name = None
+
+    def startPhase(self, name):
+        self._name = name
+        self._started_at = time.time()
+        self._shown_at = self._started_at
+        self._done = 0
+        self._total = None
+        self.showProgress('start', self.getProgress(self._started_at))
+
+    def setProgress(self, done, total):
+        if self._name is None:
+            return
+        self._done = done
+        self._total = total
+        now = time.time()
+        if now - self._shown_at >= self._interval:
+            self._shown_at = now
+            self.showProgress('progress', self.getProgress(now))
+
+    def stopPhase(self, name):
+        self.showProgress('stop', self.getProgress(time.time()))
+        self._name = None
+
+    def getProgress(self, now):
+        """Return the progress of the current phase
+
+        :param now: Current time
+        :type now: float
+        :returns: Phase name, number of processed items, number of items
+            (None if unknown), seconds since the start of the phase, items
+            per second and estimated seconds to the end of the phase (None
+            if unknown)
+        :rtype: {Dict[str -> object]}
+        """
+        elapsed = now - self._started_at
+        rate = None
+        eta = None
+        if elapsed > 0:
+            rate = self._done / elapsed
+            if rate > 0 and self._total is not None:
+                eta = max(0, self._total - self._done) / rate
+        return {'phase': self._name, 'done': self._done, 'total': self._total,
+                'elapsed_seconds': elapsed, 'rate': rate, 'eta_seconds': eta}
+
+    def showProgress(self, event, progress):
+        """Show the progress of the current phase
+
+        :param event: 'start', 'progress' or 'stop'
+        :type event: str
+        :param progress: See getProgress
+        :type progress: Dict[str -> object]
+        """
+        raise NotImplementedError()
+
+
+class TerminalProgress(ProgressListener):
+    """Show the progress of the phases on a terminal
+
+    On a terminal, the line of the current phase is rewritten at every
+    update, otherwise a line is written for every update.
+
+    :param stream: Stream to write to, defaults to sys.stderr
+    :type stream: file, optional
+    """
+
+    def __init__(self, stream=None, interval=PROGRESS_INTERVAL):
+        ProgressListener.__init__(self, interval)
+        self._stream = stream or sys.stderr
+        self._is_terminal = hasattr(self._stream, 'isatty') and self._stream.isatty()
+        self._line_length = 0
+
+    def showProgress(self, event, progress):
+        parts = []
+        if progress['total'] is not None:
+            count = '{}/{}'.format(progress['done'], progress['total'])
+            if progress['total']:
+                count += ' ({:.0%})'.format(float(progress['done']) / progress['total'])
+            parts.append(count)
+        elif progress['done']:
+            parts.append('{}'.format(progress['done']))
+        if event == 'start':
+            parts.append('started')
+        elif event == 'stop':
+            parts.append('done in {}'.format(format_duration(progress['elapsed_seconds'])))
+        else:
+            parts.append('{:.1f}/s, elapsed {}'.format(
+                progress['rate'], format_duration(progress['elapsed_seconds'])))
+            if progress['eta_seconds'] is not None:
+                parts.append('ETA {}'.format(format_duration(progress['eta_seconds'])))
+        line = '{}: {}'.format(progress['phase'], ', '.join(parts))
+        if self._is_terminal:
+            # Erase the end of the previous line of the phase
+            self._stream.write('\r' + line.ljust(self._line_length))
+            self._line_length = len(line)
+            if event == 'stop':
+                self._stream.write('\n')
+                self._line_length = 0
+        else:
+            self._stream.write(line + '\n')
+        self._stream.flush()
+
+
+class ProgressStream(ProgressListener):
+    """Write the progress of the phases as JSON Lines
+
+    Every line is an object with the keys of ProgressListener.getProgress,
+    the event ('start', 'progress' or 'stop') and the time.
+
+    :param file_name: Name of the file
+    :type file_name: str
+    """
+
+    def __init__(self, file_name, interval=PROGRESS_INTERVAL):
+        ProgressListener.__init__(self, interval)
+        self._file = open(file_name, 'w')
+
+    def showProgress(self, event, progress):
+        record = dict(progress)
+        record['event'] = event
+        record['time'] = time.time()
+        self._file.write(json.dumps(record, sort_keys=True) + '\n')
+        self._file.flush()
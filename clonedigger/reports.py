@@ -35,8 +35,15 @@ import difflib
 import re
 import copy
 import traceback
+import logging
+import types
 import os.path
+import json
+import itertools
+import multiprocessing
+import sqlite3
 from cgi import escape
+from xml.sax.saxutils import quoteattr
 
 from . import arguments
 from . import anti_unification
@@ -44,15 +51,76 @@ from . import python_compiler
 from .abstract_syntax_tree import AbstractSyntaxTree
 
 
+def get_parameters():
+    """Return the detection parameters shown in the reports
+
+    :returns: Parameter name -> value
+    :rtype: {Dict[str -> object]}
+    """
+    return {
+        'clustering_threshold': arguments.clustering_threshold,
+        'clustering_engine': arguments.clustering_engine,
+        'distance_threshold': arguments.distance_threshold,
+        'size_threshold': arguments.size_threshold,
+        'hashing_depth': arguments.hashing_depth,
+        'max_bucket_size': arguments.max_bucket_size,
+        'clusterize_using_hash': arguments.clusterize_using_hash,
+        'clusterize_using_dcup': arguments.clusterize_using_dcup}
+
+
 class Report(object):
     def __init__(self):
         self._error_info = []
         self._clones = []
         self._timers = []
         self._file_names = []
+        self._phase_listeners = []
+        self._output_paths = []  # Files and directories created by the report
         self.covered_source_lines_count = 0
         self.all_source_lines_count = 0
 
+    def openOutputFile(self, file_name, buffering=-1):
+        """Open a file of the report for writing, it is removed by removeOutput
+
+        :param file_name: File name
+        :type file_name: str
+        :param buffering: Buffer size, defaults to the system default
+        :type buffering: int, optional
+        :rtype: {file}
+        """
+        f = open(file_name, 'w', buffering)
+        self._output_paths.append(file_name)
+        return f
+
+    def createOutputDirectory(self, dir_name):
+        """Create a directory of the report if it does not exist
+
+        A directory created here is removed by removeOutput if it is empty.
+
+        :param dir_name: Directory name
+        :type dir_name: str
+        """
+        if not os.path.isdir(dir_name):
+            os.makedirs(dir_name)
+            self._output_paths.append(dir_name)
+
+    def removeOutput(self):
+        """Remove the files and directories created by the report, when the run fails
+
+        Files the report did not open, like the report of a previous run
+        which was not overwritten yet, are kept.
+        """
+        for path in reversed(self._output_paths):
+            logging.error('catched error, removing output file %s' % (path,))
+            try:
+                if os.path.isdir(path):
+                    os.rmdir(path)
+                elif os.path.exists(path):
+                    os.remove(path)
+            except OSError:
+                logging.error('%s could not be removed' % (path,))
+        self._output_paths = []
+
     def addFileName(self, file_name):
         self._file_names.append(file_name)
 
@@ -63,14 +131,58 @@ class Report(object):
         self._clones.append(clone)
 
     def sortByCloneSize(self):
-        self._clones = sorted(self._clones, key=lambda x: x.getMaxCoveredLineNumbersCount())
+        # Clones of the same size are sorted by the location of their fragments
+        self._clones = sorted(self._clones, key=lambda x: (
+            x.getMaxCoveredLineNumbersCount(), sorted([s.getLocation() for s in x])))
+
+    def addPhaseListener(self, listener):
+        """Notify a listener of the phases of the run and of the counters
+
+        :param listener: Listener
+        :type listener: phases.PhaseListener
+        """
+        self._phase_listeners.append(listener)
+
+    def startPhase(self, name):
+        """Start a phase which is not timed in the report"""
+        for listener in self._phase_listeners:
+            listener.startPhase(name)
+
+    def stopPhase(self, name):
+        """Stop a phase started with startPhase"""
+        for listener in reversed(self._phase_listeners):
+            listener.stopPhase(name)
+
+    def setCounter(self, name, value):
+        """Give the phase listeners a value computed by the current phase
+
+        :param name: Name of the counter
+        :type name: str
+        :param value: Value of the counter
+        :type value: int
+        """
+        for listener in self._phase_listeners:
+            listener.setCounter(name, value)
+
+    def setProgress(self, done, total=None):
+        """Give the phase listeners the progress of the current phase
+
+        :param done: Number of processed items
+        :type done: int
+        :param total: Number of items to process, None if unknown
+        :type total: int, optional
+        """
+        for listener in self._phase_listeners:
+            listener.setProgress(done, total)
 
     def startTimer(self, descr):
+        self.startPhase(descr)
         self._timers.append([descr, time.time(), time.ctime()])
         sys.stdout.flush()
 
     def stopTimer(self, descr=''):
         self._timers[-1][1] = time.time() - self._timers[-1][1]
+        self.stopPhase(self._timers[-1][0])
 
     def getTimerValues(self):
         return self._timers
@@ -80,6 +192,11 @@ class Report(object):
 
 
 class CPDXMLReport(Report):
+    """Report in the XML format of PMD's CPD
+
+    The clones are written sorted by size, one duplication element at a time
+    through a buffer of CPD_BUFFER_SIZE bytes.
+    """
     def __init__(self):
         Report.__init__(self)
         self._mark_to_statement_hash = None
@@ -87,29 +204,220 @@ class CPDXMLReport(Report):
     def setMarkToStatementHash(self, mark_to_statement_hash):
         self._mark_to_statement_hash = mark_to_statement_hash
 
+    def getDuplication(self, clone):
+        """Return the duplication element of a clone
+
+        :param clone: Clone class
+        :type clone: CloneClass
+        :returns: XML code of the element
+        :rtype: {str}
+        """
+        files = []
+        lines = 0
+        tokens = 0
+        for sequence in clone:
+            line_numbers = sequence.getCoveredLineNumbers()
+            lines = max(lines, len(line_numbers))
+            tokens = max(tokens, sequence.getTokenCount())
+            files.append('<file line="%d" path=%s/>\n' % (
+                1 + min(line_numbers),
+                quoteattr(os.path.abspath(sequence.getSourceFile().getFileName()))))
+        parts = ['<duplication lines="%d" tokens="%d">\n' % (lines, tokens)]
+        parts.extend(files)
+        parts.append('<codefragment>\n<![CDATA[\n')
+        for line in clone[0].getSourceLines():
+            parts.append(line.replace(']]>', '-CLONEDIGGER REMOVED CDATAEND-'))
+            parts.append('\n')
+        parts.append(']]>\n</codefragment>\n</duplication>\n')
+        return ''.join(parts)
+
     def writeReport(self, file_name):
-        with open(file_name, 'w') as f:
+        with self.openOutputFile(file_name, CPD_BUFFER_SIZE) as f:
             f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
             f.write('<pmd-cpd>\n')
             for clone in self._clones:
-                token_numbers = [sum([s.getTokenCount()
-                                      for s in clone[i]]) for i in (0, 1)]
-                f.write('<duplication lines="' + str(max([len(set(clone[i].getCoveredLineNumbers(
-                ))) for i in [0, 1]])) + '" tokens="' + str(max(token_numbers)) + '">\n')
-                for i in [0, 1]:
-                    f.write('<file line="' + str(1 + min(clone[i].getCoveredLineNumbers(
-                    ))) + '" path="' + os.path.abspath(clone[i].getSourceFile().getFileName()) + '"/>\n')
-                f.write('<codefragment>\n')
-                f.write('<![CDATA[\n')
-                for line in clone[0].getSourceLines():
-                    f.write(line.replace(']]>', '-CLONEDIGGER REMOVED CDATAEND-'))
-                    f.write('\n')
-                f.write(']]>\n')
-                f.write('</codefragment>\n')
-                f.write('</duplication>\n')
+                f.write(self.getDuplication(clone))
             f.write('</pmd-cpd>\n')
 
 
+class JSONLinesReport(Report):
+    """Report written as JSON Lines, one JSON object per line
+
+    Every clone is written as a "clone" record when it is added, and is not
+    kept in memory, so sortByCloneSize does nothing. The report file is
+    created when the first record is written. writeReport ends the
+    report with a "summary" record holding the timers and the coverage
+    counters. A clone record looks like::
+
+        {"type": "clone", "id": 1, "size": 12, "distance": 3,
+         "fragments": [{"file": "a.py", "first_line": 10, "last_line": 21}, ...],
+         "pairs": [{"fragments": [0, 1], "distance": 3, "substitutions": [...]}]}
+
+    where "pairs" are the compared fragments of the clone class, and
+    "substitutions" (only if `substitutions` is set) are, for every
+    statement, the pairs of trees substituted by the anti-unifier.
+
+    :param file_name: Report file name
+    :type file_name: str
+    :param substitutions: Write the substitutions, defaults to False
+    :type substitutions: bool, optional
+    """
+    def __init__(self, file_name, substitutions=False):
+        Report.__init__(self)
+        self._mark_to_statement_hash = None
+        self._substitutions = substitutions
+        self._clone_count = 0
+        self._file_name = file_name
+        self._file = None
+
+    def setMarkToStatementHash(self, mark_to_statement_hash):
+        self._mark_to_statement_hash = mark_to_statement_hash
+
+    def writeRecord(self, record):
+        if self._file is None:
+            self._file = self.openOutputFile(self._file_name)
+        self._file.write(json.dumps(record, sort_keys=True))
+        self._file.write('\n')
+
+    def removeOutput(self):
+        if self._file is not None:
+            self._file.close()
+        Report.removeOutput(self)
+
+    def getCloneRecord(self, clone_id, clone):
+        fragments = []
+        for sequence in clone:
+            line_numbers = sequence.getCoveredLineNumbers()
+            fragments.append({
+                'file': sequence.getSourceFile().getFileName(),
+                'first_line': min(line_numbers) + 1,
+                'last_line': max(line_numbers) + 1})
+        fragment_ids = dict([(id(sequence[0]), i) for (i, sequence) in enumerate(clone)])
+        pairs = []
+        for pair in clone.getPairs():
+            pair_record = {
+                'fragments': [fragment_ids[id(sequence[0])] for sequence in pair],
+                'distance': pair.calcDistance()}
+            if self._substitutions:
+                pair_record['substitutions'] = [
+                    [[str(tree1), str(tree2)] for (tree1, tree2) in statement_pairs]
+                    for statement_pairs in pair.getSubstitutions()]
+            pairs.append(pair_record)
+        return {
+            'type': 'clone',
+            'id': clone_id,
+            'size': max([sequence.getCoveredLineNumbersCount() for sequence in clone]),
+            'distance': clone.calcDistance(),
+            'fragments': fragments,
+            'pairs': pairs}
+
+    def addClone(self, clone):
+        self._clone_count += 1
+        self.writeRecord(self.getCloneRecord(self._clone_count, clone))
+
+    def sortByCloneSize(self):
+        pass
+
+    def writeReport(self, file_name):
+        """Write the summary record and close the report
+
+        :param file_name: Unused, the report file is given to the constructor
+        :type file_name: str
+        """
+        self.writeRecord({
+            'type': 'summary',
+            'clones': self._clone_count,
+            'files': self._file_names,
+            'errors': self._error_info,
+            'covered_source_lines': self.covered_source_lines_count,
+            'all_source_lines': self.all_source_lines_count,
+            'timers': [{'name': name, 'seconds': seconds, 'started_at': started_at}
+                       for (name, seconds, started_at) in self.getTimerValues()],
+            'parameters': get_parameters()})
+        self._file.close()
+
+
+class SQLiteReport(Report):
+    """Report stored in a SQLite database
+
+    Every run of Clone Digger adds a row to the `runs` table, the other rows
+    refer to it. Clones are inserted when they are added and are not kept in
+    memory, so sortByCloneSize does nothing. The source code of every
+    fragment is stored, so reports can be rendered from the database without
+    the source files. See SQLITE_SCHEMA for the tables.
+
+    :param file_name: Database file name, created if it does not exist
+    :type file_name: str
+    """
+    def __init__(self, file_name):
+        Report.__init__(self)
+        self._mark_to_statement_hash = None
+        self._connection = sqlite3.connect(file_name)
+        self._connection.executescript(SQLITE_SCHEMA)
+        self._run_id = self._connection.execute(
+            'INSERT INTO runs (started_at) VALUES (?)', (time.ctime(),)).lastrowid
+        self._file_ids = {}  # File name -> id in table files
+
+    def setMarkToStatementHash(self, mark_to_statement_hash):
+        self._mark_to_statement_hash = mark_to_statement_hash
+
+    def getFileId(self, file_name):
+        if file_name not in self._file_ids:
+            self._file_ids[file_name] = self._connection.execute(
+                'INSERT INTO files (run_id, name) VALUES (?, ?)',
+                (self._run_id, file_name)).lastrowid
+        return self._file_ids[file_name]
+
+    def addFileName(self, file_name):
+        Report.addFileName(self, file_name)
+        self.getFileId(file_name)
+
+    def addClone(self, clone):
+        execute = self._connection.execute
+        clone_id = execute(
+            'INSERT INTO clones (run_id, size, distance, fragment_count) VALUES (?, ?, ?, ?)',
+            (self._run_id, max([sequence.getCoveredLineNumbersCount() for sequence in clone]),
+             clone.calcDistance(), len(clone))).lastrowid
+        fragment_ids = {}
+        for sequence in clone:
+            line_numbers = sequence.getCoveredLineNumbers()
+            fragment_ids[id(sequence[0])] = execute(
+                'INSERT INTO fragments (clone_id, file_id, first_line, last_line, source) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (clone_id, self.getFileId(sequence.getSourceFile().getFileName()),
+                 min(line_numbers) + 1, max(line_numbers) + 1,
+                 '\n'.join(sequence.getSourceLines()))).lastrowid
+        self._connection.executemany(
+            'INSERT INTO pairs (clone_id, fragment_1_id, fragment_2_id, distance) VALUES (?, ?, ?, ?)',
+            [(clone_id, fragment_ids[id(pair[0][0])], fragment_ids[id(pair[1][0])], pair.calcDistance())
+             for pair in clone.getPairs()])
+
+    def sortByCloneSize(self):
+        pass
+
+    def writeReport(self, file_name):
+        """Store the run metadata and timers, and close the database
+
+        :param file_name: Unused, the database is given to the constructor
+        :type file_name: str
+        """
+        execute = self._connection.execute
+        execute('UPDATE runs SET covered_source_lines = ?, all_source_lines = ?, '
+                'parameters = ? WHERE id = ?',
+                (self.covered_source_lines_count, self.all_source_lines_count,
+                 json.dumps(get_parameters(), sort_keys=True),
+                 self._run_id))
+        self._connection.executemany(
+            'INSERT INTO timers (run_id, name, seconds, started_at) VALUES (?, ?, ?, ?)',
+            [(self._run_id, name, seconds, started_at)
+             for (name, seconds, started_at) in self.getTimerValues()])
+        self._connection.executemany(
+            'INSERT INTO errors (run_id, message) VALUES (?, ?)',
+            [(self._run_id, error_info) for error_info in self._error_info])
+        self._connection.commit()
+        self._connection.close()
+
+
 def format_line_code(s):
     s = s.replace('\t', ' ')
     s = s.replace(' ', '&nbsp; ')
@@ -120,51 +428,122 @@ def highlight(s):
         return '<span style="color: rgb(255, 0, 0);">' + s + '</span>'
 
 
-class NewAsString(object):
-    def __init__(self, s):
-        self.s = highlight(s)
-
-    def __call__(self):
-        return self.s
-
-
-def set_as_string_node_parent(t):
+def get_highlighted_node(t):
     if not isinstance(t, AbstractSyntaxTree):
         t = t.getParent()
-    n = NewAsString(t.ast_node.as_string())
-    t.ast_node.as_string = n
+    return t.ast_node
+
+
+def find_highlighted_nodes(t1, t2, s1, s2, nodes):
+    """Find the nodes to highlight in two statements
 
+    The AST nodes of the trees t1 and t2 substituted by their anti-unifier
+    are added to `nodes`, see highlighted_as_string.
 
-def rec_correct_as_string(t1, t2, s1, s2):
-    if (t1 in s1) or (t2 in s2):
+    :param s1: Ids of the trees of the first statement substituted by the anti-unifier
+    :type s1: Set[int]
+    :param s2: Ids of the trees of the second statement substituted by the anti-unifier
+    :type s2: Set[int]
+    :param nodes: Ids of the AST nodes to highlight
+    :type nodes: Set[int]
+    """
+    if (id(t1) in s1) or (id(t2) in s2):
         for t in (t1, t2):
-            set_as_string_node_parent(t)
+            nodes.add(id(get_highlighted_node(t)))
         return
     assert(len(t1.getChilds()) ==
            len(t2.getChilds()))
     for i in range(len(t1.getChilds())):
         c1 = t1.getChilds()[i]
         c2 = t2.getChilds()[i]
-        rec_correct_as_string(c1, c2, s1, s2)
+        find_highlighted_nodes(c1, c2, s1, s2, nodes)
+
+
+class HighlightedNode(object):
+    """Read-only view of an AST node, printed with some of its descendants highlighted
+
+    The as_string functions of the AST nodes print the children they get
+    from the node they are called with. They are called with this view
+    instead: the children, and the methods, it gets from the node are views
+    too, and the code of a highlighted node is highlighted. The nodes are not
+    changed, so clones can be rendered in any order and concurrently.
+
+    :param node: Viewed node
+    :param highlighted_nodes: Ids of the nodes to highlight
+    :type highlighted_nodes: Set[int]
+    """
+    def __init__(self, node, highlighted_nodes):
+        self._node = node
+        self._highlighted_nodes = highlighted_nodes
+
+    def view(self, value):
+        """Return the view of a value got from the node"""
+        if isinstance(value, (list, tuple)):
+            return type(value)([self.view(v) for v in value])
+        function = getattr(value, '__func__', None)
+        if function is not None and getattr(value, '__self__', None) is self._node:
+            # Method of the node, called with the view
+            return types.MethodType(function, self)
+        if hasattr(value, 'as_string'):
+            return HighlightedNode(value, self._highlighted_nodes)
+        return value
+
+    def as_string(self):
+        if id(self._node) in self._highlighted_nodes:
+            return highlight(self._node.as_string())
+        return self.view(self._node.as_string)()
+
+    def __getattr__(self, name):
+        value = getattr(self._node, name)
+        if name == 'parent':
+            # Compared with node classes by the as_string functions
+            return value
+        return self.view(value)
+
+    def __bool__(self):
+        return bool(self._node)
+
+    __nonzero__ = __bool__
+
+
+def highlighted_as_string(ast_node, highlighted_nodes):
+    """Return the code of a node with some of its descendants highlighted
+
+    The node is printed through HighlightedNode, it is not changed.
+
+    :param ast_node: Node to print
+    :param highlighted_nodes: Ids of the nodes to highlight, see find_highlighted_nodes
+    :type highlighted_nodes: Set[int]
+    :returns: The code of the node
+    :rtype: {str}
+    """
+    return HighlightedNode(ast_node, highlighted_nodes).as_string()
+
+
+INDENTATION_RE = re.compile(r'^\s*')
 
 
 def use_diff(statements, indentations, source_lines):
     for j in (0, 1):
         for source_line in statements[j].getSourceLines():
-            indent1 = re.findall('^\s*', source_line)[0]
+            indent1 = INDENTATION_RE.match(source_line).group(0)
             indent2 = indent1.replace('\t', 4 * ' ')
-            source_line = re.sub(
-                '^' + indent1, indentations[j].index(indent2) * ' ', source_line)
+            source_line = indentations[j].index(indent2) * ' ' + source_line[len(indent1):]
             source_lines[j].append(source_line)
-    d = diff_highlight(
-        [('\n'.join(source_lines[j])) for j in [0, 1]])
+    seqs = [('\n'.join(source_lines[j])) for j in [0, 1]]
+    if arguments.diff_highlighting == 'chars':
+        d = diff_highlight(seqs)
+    else:
+        d = line_diff_highlight(seqs)
     d = [format_line_code(d[i].replace(
         '\n', '<BR>\n')) for i in [0, 1]]
     d = [d[i].replace(HTMLReport.very_strange_const, ' ')
          for i in (0, 1)]
-    u = anti_unification.Unifier(
-        statements[0], statements[1])
-    return d, u
+    return d
+
+
+def highlight_difference(s):
+    return '<span' + HTMLReport.very_strange_const + 'style="color:rgb(255,0,0);">%s</span>' % (escape(s),)
 
 
 def diff_highlight(seqs):
@@ -182,13 +561,219 @@ def diff_highlight(seqs):
         if (i < (len(blocks) - 1)):
             nextblock = blocks[i + 1]
             for j in [0, 1]:
-                r[j] += '<span' + HTMLReport.very_strange_const + 'style="color:rgb(255,0,0);">%s</span>' %\
-                    (escape(seqs[j][block[j] + block[2]:nextblock[j]]),)
+                r[j] += highlight_difference(seqs[j][block[j] + block[2]:nextblock[j]])
     return r
 
 
+def line_diff_highlight(seqs):
+    """Highlight the differences between two texts, line by line
+
+    Same result format as diff_highlight, but the lines of the texts are
+    aligned first, and characters are only compared inside pairs of changed
+    lines, so long texts are not compared character by character.
+
+    :param seqs: The two texts
+    :type seqs: List[str]
+    :returns: The two texts, escaped, with their differences highlighted
+    :rtype: {List[str]}
+    """
+    lines = [seq.split('\n') for seq in seqs]
+    matcher = difflib.SequenceMatcher(None, lines[0], lines[1], False)
+    r = ([], [])
+    for (tag, i1, i2, j1, j2) in matcher.get_opcodes():
+        if tag == 'equal':
+            for line in lines[0][i1:i2]:
+                r[0].append(escape(line))
+                r[1].append(escape(line))
+            continue
+        changed = (lines[0][i1:i2], lines[1][j1:j2])
+        paired = min(len(changed[0]), len(changed[1]))
+        for k in range(paired):
+            d = diff_highlight([changed[0][k], changed[1][k]])
+            r[0].append(d[0])
+            r[1].append(d[1])
+        for j in [0, 1]:
+            for line in changed[j][paired:]:
+                r[j].append(highlight_difference(line))
+    return ['\n'.join(r[0]), '\n'.join(r[1])]
+
+
+def render_statements(statements, pairs):
+    """Return the HTML code of two aligned statements with their differences highlighted
+
+    :param statements: The two statements
+    :type statements: List[AbstractSyntaxTree]
+    :param pairs: Pairs of trees substituted by the anti-unifier of the
+        statements, see PairSequences.getSubstitutions
+    :type pairs: List[Tuple[AbstractSyntaxTree, AbstractSyntaxTree]]
+    :returns: HTML code of the two statements
+    :rtype: {List[str]}
+    """
+    # preparation of indentation
+    indentations = (set(), set())
+    for j in (0, 1):
+        for source_line in statements[j].getSourceLines():
+            indentations[j].add(
+                INDENTATION_RE.match(source_line).group(0).replace('\t', 4 * ' ')
+            )
+    indentations = (
+        list(indentations[0]),
+        list(indentations[1]))
+    indentations[0].sort()
+    indentations[1].sort()
+    source_lines = ([], [])
+
+    if arguments.use_diff:
+        return use_diff(statements, indentations, source_lines)
+    try:
+        (s1, s2) = (statements[0], statements[1])
+        highlighted_nodes = set()
+        find_highlighted_nodes(
+            s1, s2,
+            set([id(pair[0]) for pair in pairs]),
+            set([id(pair[1]) for pair in pairs]),
+            highlighted_nodes)
+        d = [None, None]
+        for j in (0, 1):
+            d[j] = highlighted_as_string(statements[j].ast_node, highlighted_nodes)
+
+            lines = d[j].split('\n')
+            for ii in range(len(lines)):
+                temp_line = ''
+                jj = 0
+                try:
+                    while lines[ii][jj] == ' ':
+                        temp_line += '&nbsp;'
+                        jj += 1
+                except IndexError:
+                    # suppress errors if line has no leading spaces
+                    pass
+                temp_line += lines[ii][jj:]
+                lines[ii] = temp_line
+            d[j] = '\n'.join(lines)
+
+            d[j] = d[j].replace('\n', '<BR>\n')
+        return d
+    except:
+        print('The following error occured during highlighting'
+              'of differences on the AST level:')
+        traceback.print_exc()
+        print('using diff highlight')
+        return use_diff(statements, indentations, source_lines)
+
+
+def render_pair(clone):
+    """Return the HTML table showing the two fragments of a pair side by side
+
+    The table is returned in parts, the Eclipse-only part starts with
+    `HTMLReport.eclipse_start`, see HTMLReport.writeParts.
+
+    :param clone: Pair of fragments
+    :type clone: PairSequences
+    :returns: HTML code of the table
+    :rtype: {List[str]}
+    """
+    parts = ['<TABLE NOWRAP WIDTH=100% BORDER=1>']
+    s = HTMLReport.eclipse_start
+    s += '<TR>'
+    for j in [0, 1]:
+        s += '<TD> <a href="clone://%s?%d&%d"> Go to this fragment in '\
+             'Eclipse </a> </TD>' % (clone[j].getSourceFile().getFileName(),
+                                     min(clone[j][0].getCoveredLineNumbers()),
+                                     max(clone[j][-1].getCoveredLineNumbers()))
+        if j == 0:
+            s += '<TD></TD>'
+    s += '</TR>'
+    s += HTMLReport.eclipse_end
+    parts.append(s)
+    s = ''
+    for j in [0, 1]:
+        s += '<TD>'
+        s += 'Source file "%s"<BR>' % (
+            clone[j].getSourceFile().getFileName(),)
+        if clone[j][0].getCoveredLineNumbers() == []:
+            # TODO remove after...
+            pdb.set_trace()
+        s += 'The first line is %d' % (
+            min(clone[j][0].getCoveredLineNumbers()) + 1,)
+        s += '</TD>'
+        if j == 0:
+            s += '<TD></TD>'
+    s += '</TR>'
+    parts.append(s)
+    substitutions = clone.getSubstitutions()
+    for i in range(clone[0].getLength()):
+        statements = [clone[j][i] for j in [0, 1]]
+        # Pairs of trees substituted by the anti-unifier of the statements
+        pairs = substitutions[i]
+        d = render_statements(statements, pairs)
+        if sum(anti_unification.pairs_sizes(pairs)) > 0:
+            color = 'RED'
+        else:
+            color = 'AQUA'
+        parts.append('<TR>\n' + '<TD>\n' + d[0] + '</TD>\n' +
+                     '<TD style="width: 10px;" BGCOLOR=%s> </TD>' % (color,) +
+                     '<TD>\n' + d[1] + '</TD>\n' + '</TR>\n')
+    parts.append('</TABLE>')
+    return parts
+
+
+def render_clone(clone_i, clone):
+    """Return the HTML description of a clone class
+
+    Rendering does not change the clone, so clones can be rendered in any
+    order and in parallel, see HTMLReport.renderCloneDescriptions.
+
+    :param clone_i: Index of the clone in the report
+    :type clone_i: int
+    :param clone: Clone class
+    :type clone: CloneClass
+    :returns: HTML code of the description, see render_pair
+    :rtype: {List[str]}
+    """
+    s = '<P>'
+    s += '<B>Clone # %d</B><BR>' % (clone_i + 1,)
+    # s = '<P> Clone detected in source files "%s" and "%s" <BR>\n' % (
+    #     sequences[0].getSourceFile().getFileName(),
+    #     sequences[1].getSourceFile().getFileName())
+    if len(clone) > 2:
+        s += 'Fragments = %d <BR>' % (len(clone),)
+        s += 'Maximum distance between two compared fragments = %d <BR>' % (
+            clone.calcDistance())
+    else:
+        s += 'Distance between two fragments = %d <BR>' % (
+            clone.calcDistance())
+    s += 'Clone size = ' + \
+        str(max([len(set(sequence.getCoveredLineNumbers()))
+                 for sequence in clone]))
+    parts = [s]
+    for pair in clone.getPairs():
+        parts.extend(render_pair(pair))
+    parts.append(' </P> <HR>')
+    return parts
+
+
+_parallel_report = None  # HTMLReport rendered by the worker processes
+
+
+def _describe_clone(report, clone_i):
+    """Return the description of a clone, or None if it can not be rendered"""
+    try:
+        return report.getCloneDescription(clone_i, report._clones[clone_i])
+    except:
+        print("Clone info can't be written to the report. ")
+        traceback.print_exc()
+        return None
+
+
+def _describe_parallel_clone(clone_i):
+    return _describe_clone(_parallel_report, clone_i)
+
+
 class HTMLReport(Report):
     very_strange_const = 'VERY_STRANGE_CONST'
+    eclipse_start = '\n<!--ECLIPSE START-->'
+    eclipse_end = '\n<!--ECLIPSE END-->'
 
     def __init__(self):
         Report.__init__(self)
@@ -197,145 +782,126 @@ class HTMLReport(Report):
     def setMarkToStatementHash(self, mark_to_statement_hash):
         self._mark_to_statement_hash = mark_to_statement_hash
 
-    def writeReport(self, file_name):
-        # TODO REWRITE! This function code was created in a hurry
-        eclipse_start = '\n<!--ECLIPSE START-->'
-        eclipse_end = '\n<!--ECLIPSE END-->'
+    def getCloneDescription(self, clone_i, clone):
+        return render_clone(clone_i, clone)
 
-        errors_info = "\n".join(['<P> <FONT COLOR=RED> %s </FONT> </P>' % (
-            error_info.replace('\n', '<BR>'),) for error_info in self._error_info])
+    def renderCloneDescriptions(self, clone_indexes):
+        """Yield the descriptions of clones, in order
 
-        clone_descriptions = []
-        for clone_i in range(len(self._clones)):
+        With `arguments.report_jobs` > 1, the clones are rendered by a pool of
+        forked processes, which read the clones from the memory of this process.
+
+        :param clone_indexes: Indexes of the clones to render
+        :type clone_indexes: List[int]
+        :returns: The description of every clone, None if it can not be rendered
+        :rtype: {Iterator[List[str]]}
+        """
+        global _parallel_report
+        context = None
+        if arguments.report_jobs > 1 and len(clone_indexes) > 1:
             try:
-                clone = self._clones[clone_i]
-                s = '<P>'
-                s += '<B>Clone # %d</B><BR>' % (clone_i + 1,)
-                # s = '<P> Clone detected in source files "%s" and "%s" <BR>\n' % (
-                #     sequences[0].getSourceFile().getFileName(),
-                #     sequences[1].getSourceFile().getFileName())
-                s += 'Distance between two fragments = %d <BR>' % (
-                    clone.calcDistance())
-                s += 'Clone size = ' + \
-                    str(max([len(set(clone[i].getCoveredLineNumbers()))
-                             for i in [0, 1]]))
-                s += '<TABLE NOWRAP WIDTH=100% BORDER=1>'
-                s += eclipse_start
-                s += '<TR>'
-                for j in [0, 1]:
-                    s += '<TD> <a href="clone://%s?%d&%d"> Go to this fragment in '\
-                         'Eclipse </a> </TD>' % (clone[j].getSourceFile().getFileName(),
-                                                 min(clone[j][0].getCoveredLineNumbers()),
-                                                 max(clone[j][-1].getCoveredLineNumbers()))
-                    if j == 0:
-                        s += '<TD></TD>'
-                s += '</TR>'
-                s += eclipse_end
-                for j in [0, 1]:
-                    s += '<TD>'
-                    s += 'Source file "%s"<BR>' % (
-                        clone[j].getSourceFile().getFileName(),)
-                    if clone[j][0].getCoveredLineNumbers() == []:
-                        # TODO remove after...
-                        pdb.set_trace()
-                    s += 'The first line is %d' % (
-                        min(clone[j][0].getCoveredLineNumbers()) + 1,)
-                    s += '</TD>'
-                    if j == 0:
-                        s += '<TD></TD>'
-                s += '</TR>'
-                for i in range(clone[0].getLength()):
-                    s += '<TR>\n'
-                    t = []
-                    statements = [clone[j][i] for j in [0, 1]]
-
-                    # preparation of indentation
-                    indentations = (set(), set())
-                    for j in (0, 1):
-                        for source_line in statements[j].getSourceLines():
-                            indentations[j].add(
-                                re.findall('^\s*', source_line)[0].replace('\t', 4 * ' ')
-                            )
-                    indentations = (
-                        list(indentations[0]),
-                        list(indentations[1]))
-                    indentations[0].sort()
-                    indentations[1].sort()
-                    source_lines = ([], [])
-
-                    if arguments.use_diff:
-                        (d, u) = use_diff(statements, indentations, source_lines)
-                    else:
-                        try:
-                            (s1, s2) = (statements[0], statements[1])
-                            u = anti_unification.Unifier(s1, s2)
-                            rec_correct_as_string(
-                                s1, s2,
-                                list(u.getSubstitutions()[0].getMap().values()),
-                                list(u.getSubstitutions()[1].getMap().values()))
-                            d = [None, None]
-                            for j in (0, 1):
-                                d[j] = statements[j].ast_node.as_string()
-
-                                lines = d[j].split('\n')
-                                for ii in range(len(lines)):
-                                    temp_line = ''
-                                    jj = 0
-                                    try:
-                                        while lines[ii][jj] == ' ':
-                                            temp_line += '&nbsp;'
-                                            jj += 1
-                                    except IndexError:
-                                        # suppress errors if line has no leading spaces
-                                        pass
-                                    temp_line += lines[ii][jj:]
-                                    lines[ii] = temp_line
-                                d[j] = '\n'.join(lines)
-
-                                d[j] = d[j].replace('\n', '<BR>\n')
-
-                        except:
-                            print('The following error occured during highlighting'
-                                  'of differences on the AST level:')
-                            traceback.print_exc()
-                            print('using diff highlight')
-                            (d, u) = use_diff(statements, indentations, source_lines)
-                    for j in [0, 1]:
-                        t.append('<TD>\n' + d[j] + '</TD>\n')
-                    if u.getSize() > 0:
-                        color = 'RED'
-                    else:
-                        color = 'AQUA'
-                    s += t[0] + \
-                        '<TD style="width: 10px;" BGCOLOR=%s> </TD>' % (
-                            color,) + t[1]
-                    s += '</TR>\n'
-                s += '</TABLE> </P> <HR>'
-                clone_descriptions.append(s)
-            except:
-                print("Clone info can't be written to the report. ")
-                traceback.print_exc()
-
-        descr = """<P>Source files: %d</P>
-        <a href = "javascript:unhide('files');">Click here to show/hide file names</a>
-        <div id="files" class="hidden"><P><B>Source files:</B><BR>%s</P></div>
+                context = multiprocessing.get_context('fork')
+            except AttributeError:
+                # Python 2, processes are always forked
+                context = multiprocessing
+            except ValueError:
+                print('Processes can not be forked, rendering with one process')
+        if context is None:
+            for (rendered_count, clone_i) in enumerate(clone_indexes, 1):
+                yield _describe_clone(self, clone_i)
+                self.setProgress(rendered_count, len(clone_indexes))
+            return
+
+        _parallel_report = self
+        pool = context.Pool(arguments.report_jobs)
+        try:
+            chunksize = max(1, len(clone_indexes) // (arguments.report_jobs * 16))
+            parts_iterator = pool.imap(_describe_parallel_clone, clone_indexes, chunksize)
+            for (rendered_count, parts) in enumerate(parts_iterator, 1):
+                yield parts
+                self.setProgress(rendered_count, len(clone_indexes))
+            pool.close()
+        except GeneratorExit:
+            # The descriptions are not all read, the remaining ones are not needed
+            pool.terminate()
+            raise
+        except (Exception, KeyboardInterrupt):
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+            _parallel_report = None
+
+    def writeCloneDescriptions(self, f, eclipse_f, descriptions):
+        """Write the descriptions of clones, see writeParts
+
+        :param descriptions: Descriptions of clones, see renderCloneDescriptions
+        :type descriptions: Iterator[List[str]]
+        """
+        first = True
+        for parts in descriptions:
+            if parts is None:
+                continue
+            if not first:
+                parts.insert(0, '<BR>\n')
+            first = False
+            self.writeParts(f, eclipse_f, parts)
+
+    def writeParts(self, f, eclipse_f, parts):
+        """Write parts of the report to the report and to the Eclipse report
+
+        Parts starting with `eclipse_start` are only written to the Eclipse
+        report.
+
+        :param f: Report file
+        :type f: file
+        :param eclipse_f: Eclipse report file, or None
+        :type eclipse_f: file
+        :param parts: HTML code
+        :type parts: List[str]
+        """
+        for part in parts:
+            if eclipse_f is not None:
+                eclipse_f.write(part)
+            if not part.startswith(self.eclipse_start):
+                f.write(part)
+
+    def getErrorsInfo(self):
+        return "\n".join(['<P> <FONT COLOR=RED> %s </FONT> </P>' % (
+            error_info.replace('\n', '<BR>'),) for error_info in self._error_info])
+
+    def getSummary(self, file_names):
+        """Return the HTML summary of the detection
+
+        :param file_names: HTML code showing the names of the source files
+        :type file_names: str
+        :returns: HTML code of the summary
+        :rtype: {str}
+        """
+        return """<P>Source files: %d</P>
+        %s
         <P>Clones detected: %d</P>
         <P>%d of %d lines are duplicates (%.2f%%) </P>
 <P>
 <B>Parameters<BR> </B>
 clustering_threshold = %d<BR>
+clustering_engine = %s<BR>
 distance_threshold = %d<BR>
 size_threshold = %d<BR>
 hashing_depth = %d<BR>
+max_bucket_size = %s<BR>
 clusterize_using_hash = %s<BR>
 clusterize_using_dcup = %s<BR>
 </P>
-        """ % (len(self._file_names), ', <BR>'.join(self._file_names), len(self._clones),
+        """ % (len(self._file_names), file_names, len(self._clones),
                self.covered_source_lines_count, self.all_source_lines_count,
                (not self.all_source_lines_count and 100) or 100 * self.covered_source_lines_count / float(self.all_source_lines_count),
-               arguments.clustering_threshold, arguments.distance_threshold,
+               arguments.clustering_threshold, arguments.clustering_engine,
+               arguments.distance_threshold,
                arguments.size_threshold, arguments.hashing_depth,
-               str(arguments.clusterize_using_hash), str(arguments.clusterize_using_dcup))
+               str(arguments.max_bucket_size), str(arguments.clusterize_using_hash), str(arguments.clusterize_using_dcup))
+
+    def getTimings(self):
         if arguments.print_time:
             timings = ''
             timings += '<B>Time elapsed</B><BR>'
@@ -346,7 +912,9 @@ clusterize_using_dcup = %s<BR>
             timings += '<BR>\n Finished at: ' + self._timers[-1][2]
         else:
             timings = ''
+        return timings
 
+    def getMarksReport(self):
         marks_report = ''
         if self._mark_to_statement_hash:
             marks_report += '<P>Top 20 statement marks:'
@@ -363,15 +931,152 @@ clusterize_using_dcup = %s<BR>
                     marks_report += str(statement) + '<BR>'
                 marks_report += '</div>'
                 marks_report += '</P>'
+        return marks_report
 
+    def getWarnings(self):
         warnings = ''
         if arguments.use_diff:
             warnings += '<P>(*) Warning: the highlighting of differences is based on '\
                         'diff and doesn\'t reflect the tree-based clone detection algorithm.</P>'
-        save_to = eclipse_start + \
+        return warnings
+
+    def writeReport(self, file_name):
+        """Write the report clone by clone
+
+        The report and the Eclipse report (`arguments.eclipse_output`) are
+        written in the same pass.
+
+        :param file_name: Report file name
+        :type file_name: str
+        """
+        file_names = """<a href = "javascript:unhide('files');">Click here to show/hide file names</a>
+        <div id="files" class="hidden"><P><B>Source files:</B><BR>%s</P></div>""" % (
+            ', <BR>'.join(self._file_names),)
+        save_to = self.eclipse_start + \
             '<b><a href="file://%s">Save this report</a></b>' % (
-                file_name,) + eclipse_end
-        HTML_code = """
+                file_name,) + self.eclipse_end
+
+        f = self.openOutputFile(file_name)
+        eclipse_f = None
+        try:
+            if arguments.eclipse_output:
+                eclipse_f = self.openOutputFile(arguments.eclipse_output)
+            self.writeParts(f, eclipse_f, [
+                HTML_HEADER, self.getErrorsInfo(), '\n    ', save_to, '\n    ',
+                self.getSummary(file_names), '\n    ', self.getTimings(), '\n    '])
+            self.writeCloneDescriptions(
+                f, eclipse_f, self.renderCloneDescriptions(list(range(len(self._clones)))))
+            self.writeParts(f, eclipse_f, [
+                '\n    ', self.getMarksReport(), '\n    ', self.getWarnings(), HTML_FOOTER])
+        finally:
+            f.close()
+            if eclipse_f is not None:
+                eclipse_f.close()
+
+
+class PaginatedHTMLReport(HTMLReport):
+    """HTML report split into a summary page and pages of clones
+
+    The summary page (the report file) has a row per clone with its size,
+    distance, number of fragments and source files, which can be sorted by
+    clicking on the headers. Every row links to the page of the clone. The
+    pages of `clones_per_page` clones and the list of the source files are
+    written in the directory `<report file name without extension>_files`,
+    so a browser only loads the clones it shows. No Eclipse report is
+    written.
+
+    :param clones_per_page: Number of clones written per page
+    :type clones_per_page: int
+    """
+    def __init__(self, clones_per_page):
+        HTMLReport.__init__(self)
+        assert clones_per_page > 0
+        self._clones_per_page = clones_per_page
+
+    def getCloneDescription(self, clone_i, clone):
+        parts = HTMLReport.getCloneDescription(self, clone_i, clone)
+        parts.insert(0, '<a name="clone%d"></a>' % (clone_i + 1,))
+        return parts
+
+    def getCloneRow(self, clone_i, clone, page_name):
+        """Return the row of a clone in the summary table
+
+        :param page_name: Name of the page of the clone, relative to the summary page
+        :type page_name: str
+        :returns: HTML code of the row
+        :rtype: {str}
+        """
+        size = max([len(set(sequence.getCoveredLineNumbers())) for sequence in clone])
+        file_names = []
+        for sequence in clone:
+            if sequence.getSourceFile().getFileName() not in file_names:
+                file_names.append(sequence.getSourceFile().getFileName())
+        return '<TR><TD><a href="%s#clone%d">%d</a></TD><TD>%d</TD><TD>%d</TD>'\
+               '<TD>%d</TD><TD>%s</TD></TR>\n' % (
+                   page_name, clone_i + 1, clone_i + 1, size, clone.calcDistance(),
+                   len(clone), '<BR>'.join(file_names))
+
+    def writeReport(self, file_name):
+        """Write the summary page and the pages of clones
+
+        :param file_name: Summary page file name
+        :type file_name: str
+        """
+        pages_dir = os.path.splitext(file_name)[0] + '_files'
+        self.createOutputDirectory(pages_dir)
+        pages_dir_name = os.path.basename(pages_dir)
+        summary_name = os.path.basename(file_name)
+
+        with self.openOutputFile(os.path.join(pages_dir, 'files.html')) as f:
+            self.writeParts(f, None, [
+                HTML_HEADER, '<P><a href="../%s">Back to the summary</a></P>' % (summary_name,),
+                '<P><B>Source files:</B><BR>%s</P>' % (', <BR>'.join(self._file_names),),
+                HTML_FOOTER])
+
+        page_count = (len(self._clones) + self._clones_per_page - 1) // self._clones_per_page
+        descriptions = self.renderCloneDescriptions(list(range(len(self._clones))))
+        try:
+            for page in range(page_count):
+                first = page * self._clones_per_page
+                end = min(first + self._clones_per_page, len(self._clones))
+                with self.openOutputFile(os.path.join(pages_dir, 'clones_%d.html' % (page + 1,))) as f:
+                    self.writeParts(f, None, [
+                        HTML_HEADER, '<P><a href="../%s">Back to the summary</a> - Clones %d to %d</P>\n' % (
+                            summary_name, first + 1, end)])
+                    self.writeCloneDescriptions(f, None, itertools.islice(descriptions, end - first))
+                    self.writeParts(f, None, ['\n    ', self.getWarnings(), HTML_FOOTER])
+            # islice stops before the end of the generator, which closes the
+            #  pool of renderCloneDescriptions once it is resumed
+            for _ in descriptions:
+                pass
+        finally:
+            # Stops the workers if a page could not be written
+            descriptions.close()
+
+        file_names = '<a href="%s/files.html">Click here to show file names</a>' % (pages_dir_name,)
+        with self.openOutputFile(file_name) as f:
+            self.writeParts(f, None, [
+                HTML_HEADER, SORT_SCRIPT, self.getErrorsInfo(), '\n    ',
+                self.getSummary(file_names), '\n    ', self.getTimings(), '\n    ',
+                '<TABLE id="clones" BORDER=1><THEAD><TR>'
+                '<TH onclick="sortTable(0)">Clone</TH><TH onclick="sortTable(1)">Size</TH>'
+                '<TH onclick="sortTable(2)">Distance</TH><TH onclick="sortTable(3)">Fragments</TH>'
+                '<TH onclick="sortTable(4)">Files</TH></TR></THEAD><TBODY>\n'])
+            for clone_i in range(len(self._clones)):
+                page_name = '%s/clones_%d.html' % (pages_dir_name, clone_i // self._clones_per_page + 1)
+                try:
+                    f.write(self.getCloneRow(clone_i, self._clones[clone_i], page_name))
+                except:
+                    print("Clone info can't be written to the report. ")
+                    traceback.print_exc()
+            self.writeParts(f, None, [
+                '</TBODY></TABLE>', '\n    ', self.getMarksReport(), '\n    ',
+                self.getWarnings(), HTML_FOOTER])
+
+
+CPD_BUFFER_SIZE = 1 << 16  # Size of the write buffer of the CPD report
+
+HTML_HEADER = """
 <HTML>
     <HEAD>
         <TITLE> CloneDigger Report </TITLE>
@@ -415,20 +1120,83 @@ clusterize_using_dcup = %s<BR>
 
     </HEAD>
     <BODY>
-    %s
-    %s
-    %s
-    %s
-    %s
-    %s
-    %s
+    """
+
+HTML_FOOTER = """
     <HR>
     Clone Digger is aimed to find software clones in Python and Java programs. It is provided under the GPL license and can be downloaded from the site <a href="http://clonedigger.sourceforge.net">http://clonedigger.sourceforge.net</a>
     </BODY>
-</HTML>""" % (errors_info, save_to, descr, timings, '<BR>\n'.join(clone_descriptions), marks_report, warnings)
-        with open(file_name, 'w') as f:
-            f.write(re.sub(eclipse_start + '.*?' + eclipse_end, '', HTML_code))
+</HTML>"""
+
+
+SORT_SCRIPT = """
+    <script type="text/javascript">
+    function sortTable(column) {
+        var table = document.getElementById('clones');
+        var body = table.tBodies[0];
+        var rows = Array.prototype.slice.call(body.rows);
+        var ascending = table.getAttribute('data-sorted') != String(column);
+        rows.sort(function(a, b) {
+            var x = a.cells[column].textContent, y = b.cells[column].textContent;
+            var r = (isNaN(parseFloat(x)) || isNaN(parseFloat(y))) ?
+                (x < y ? -1 : (x > y ? 1 : 0)) : parseFloat(x) - parseFloat(y);
+            return ascending ? r : -r;
+        });
+        for (var i = 0; i < rows.length; i++) {
+            body.appendChild(rows[i]);
+        }
+        table.setAttribute('data-sorted', ascending ? String(column) : '');
+    }
+    </script>
+    """
 
-        if arguments.eclipse_output:
-            with open(arguments.eclipse_output, 'w') as f:
-                f.write(HTML_code)
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started_at TEXT,
+    covered_source_lines INTEGER,
+    all_source_lines INTEGER,
+    parameters TEXT
+);
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER REFERENCES runs (id),
+    name TEXT
+);
+CREATE TABLE IF NOT EXISTS clones (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER REFERENCES runs (id),
+    size INTEGER,
+    distance REAL,
+    fragment_count INTEGER
+);
+CREATE TABLE IF NOT EXISTS fragments (
+    id INTEGER PRIMARY KEY,
+    clone_id INTEGER REFERENCES clones (id),
+    file_id INTEGER REFERENCES files (id),
+    first_line INTEGER,
+    last_line INTEGER,
+    source TEXT
+);
+CREATE TABLE IF NOT EXISTS pairs (
+    clone_id INTEGER REFERENCES clones (id),
+    fragment_1_id INTEGER REFERENCES fragments (id),
+    fragment_2_id INTEGER REFERENCES fragments (id),
+    distance REAL
+);
+CREATE TABLE IF NOT EXISTS timers (
+    run_id INTEGER REFERENCES runs (id),
+    name TEXT,
+    seconds REAL,
+    started_at TEXT
+);
+CREATE TABLE IF NOT EXISTS errors (
+    run_id INTEGER REFERENCES runs (id),
+    message TEXT
+);
+CREATE INDEX IF NOT EXISTS files_name ON files (name);
+CREATE INDEX IF NOT EXISTS clones_run_size ON clones (run_id, size);
+CREATE INDEX IF NOT EXISTS fragments_file_lines ON fragments (file_id, first_line, last_line);
+CREATE INDEX IF NOT EXISTS fragments_clone ON fragments (clone_id);
+CREATE INDEX IF NOT EXISTS pairs_clone ON pairs (clone_id);
+"""
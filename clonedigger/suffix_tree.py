@@ -95,7 +95,7 @@ class SuffixTree(object):
             f_code = lambda x: x
         self._f_code = f_code  # Function[E -> K]
 
-    def _add(self, string, prevelem):
+    def _add(self, string, prevelem, codes):
         """Add a suffix to the tree
 
         [description]
@@ -104,16 +104,17 @@ class SuffixTree(object):
         :type string: Iterable[E]
         :param prevelem: Key of previous element
         :type prevelem: K
+        :param codes: Keys of the elements of string
+        :type codes: List[K]
         """
         pos = 0
         node = self._node
-        for pos, elt in enumerate(string):
+        for pos, code in enumerate(codes):
             # Save string in node
             node.string_positions.append(
                 self.StringPosition(string, pos, prevelem))
 
             # Walk the tree adding nodes
-            code = self._f_code(elt)
             if code not in node.childs:
                 node.childs[code] = self.SuffixTreeNode()
             node = node.childs[code]
@@ -129,18 +130,21 @@ class SuffixTree(object):
         :param string: String to add
         :type string: Iterable[E]
         """
+        # Keys are computed once for all suffixes
+        codes = [self._f_code(elt) for elt in string]
         # For every suffix add the suffix
         for i in range(len(string)):
             if i == 0:
                 prevelem = None
             else:
-                prevelem = self._f_code(string[i - 1])
-            self._add(string[i:], prevelem)
+                prevelem = codes[i - 1]
+            self._add(string[i:], prevelem, codes[i:])
 
     def getBestMaxSubstrings(self, threshold, f=None, f_elem=None, node=None, initial_threshold=None):
         """[summary]
 
-        [description]
+        The tree is walked depth first with an explicit stack, as a long
+        repeated sequence makes the tree deeper than the recursion limit.
 
         :param threshold: Used to know when to start adding candidate
         :type threshold: int
@@ -150,7 +154,7 @@ class SuffixTree(object):
         :type f_elem: Function[List[E] -> int], optional
         :param node: Node to use as root, defaults to None
         :type node: SuffixTreeNode, optional
-        :param initial_threshold: Leave empty, keep original threshold in recursive calls, defaults to None
+        :param initial_threshold: Threshold of the candidates, defaults to threshold
         :type initial_threshold: [type], optional
         :returns: List of candidate clones
         :rtype: {List[Tuple[List[E], List[E]]]}
@@ -180,6 +184,17 @@ class SuffixTree(object):
                 return False
 
         r = []
+        # (Node, threshold of the node), children are visited in order
+        stack = [(node, threshold)]
+        while stack:
+            (node, threshold) = stack.pop()
+            self._addBestMaxSubstrings(node, threshold, check_left_diverse_and_add)
+            stack.extend(reversed([(child, threshold - f(code))
+                                   for (code, child) in list(node.childs.items())]))
+        return r
+
+    def _addBestMaxSubstrings(self, node, threshold, check_left_diverse_and_add):
+        """Add the candidates of one node, see getBestMaxSubstrings"""
         if threshold <= 0:
             # TODO: use itertools.product(node.ending_strings, node.string_positions)
             for s1 in node.ending_strings:
@@ -209,11 +224,6 @@ class SuffixTree(object):
                         for s2 in node.childs[c2].string_positions + node.childs[c2].ending_strings:
                             check_left_diverse_and_add(s1, s2, 1)
 
-        for (code, child) in list(node.childs.items()):
-            r += self.getBestMaxSubstrings(
-                threshold - f(code), f, f_elem, child, initial_threshold)
-        return r
-
 
 if __name__ == '__main__':
     class Elem(object):
@@ -40,5 +40,6 @@ setup(
     include_package_data=True,
     zip_safe=False,
     install_requires=['future', 'setuptools'],
+    extras_require={'lsh': ['numpy']},
     entry_points=entry_points,
 )